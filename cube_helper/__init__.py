@@ -13,8 +13,10 @@ from cube_helper.cube_help import (load,
 from cube_helper.cube_loader import (load_from_dir,
                                      load_from_filelist,
                                      sort_by_earliest_date,
-                                     file_sort_by_earliest_date)
+                                     file_sort_by_earliest_date,
+                                     iter_cubes)
 from cube_helper.cube_equaliser import (examine_dim_bounds,
+                                        examine_time_extents,
                                         equalise_time_units,
                                         equalise_attributes,
                                         equalise_dim_coords,
@@ -22,6 +24,13 @@ from cube_helper.cube_equaliser import (examine_dim_bounds,
                                         equalise_data_type,
                                         equalise_all,
                                         remove_attributes,
-                                        compare_cubes)
+                                        compare_cubes,
+                                        compare_and_equalise,
+                                        plan_equalisation,
+                                        EqualisationPlan)
+from cube_helper.cube_scanner import (scan_file,
+                                      scan_files)
+from cube_helper.cube_catalog import Catalog
+from cube_helper.cube_categorical import clear_categorical_cache
 from cube_helper.logger import (muffle_logger,
                                 reset_logger)
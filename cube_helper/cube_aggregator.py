@@ -0,0 +1,391 @@
+# (C) Crown Copyright, Met Office. All rights reserved.
+#
+# This file is part of cube_helper and is released under the
+# BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+from __future__ import (absolute_import, division, print_function)
+from collections import namedtuple
+import numpy as np
+import iris
+import iris.analysis
+
+# The aggregators whose results can be built up from the partial states
+# of blocks of data, by the statistic they compute.
+_STATISTICS = (('mean', iris.analysis.MEAN),
+               ('sum', iris.analysis.SUM),
+               ('min', iris.analysis.MIN),
+               ('max', iris.analysis.MAX),
+               ('var', iris.analysis.VARIANCE),
+               ('std', iris.analysis.STD_DEV))
+
+# The reductions of a group's segment of unmasked data that give the same
+# values as the aggregators do, by statistic. ma.average copies the data
+# into C order before summing it, so the mean does too.
+_KERNELS = {'mean': lambda data, axis: np.ascontiguousarray(data).mean(axis),
+            'sum': lambda data, axis: np.sum(data, axis=axis),
+            'min': lambda data, axis: np.min(data, axis=axis),
+            'max': lambda data, axis: np.max(data, axis=axis)}
+
+# The statistics whose values do not depend on the order the values are
+# reduced in, so can be reduced from views of the data.
+_ORDER_FREE = ('min', 'max')
+
+_GroupIndex = namedtuple('_GroupIndex', ['order', 'starts', 'counts'])
+
+# The components of the partial state each statistic needs.
+_COMPONENTS = {'mean': ('count', 'total'),
+               'sum': ('count', 'total'),
+               'min': ('count', 'minimum'),
+               'max': ('count', 'maximum'),
+               'var': ('count', 'mean', 'm2'),
+               'std': ('count', 'mean', 'm2')}
+
+
+def streamable(aggregator):
+    """
+    Whether an aggregator can be computed by streamed_aggregated_by.
+
+    Args:
+        aggregator: an iris aggregator, e.g. iris.analysis.MEAN.
+
+    Returns:
+        True if the aggregator is one of MEAN, SUM, MIN, MAX, VARIANCE
+        or STD_DEV, otherwise False.
+    """
+    return any(aggregator is known_aggregator
+               for _, known_aggregator in _STATISTICS)
+
+
+def _statistic(aggregator):
+    for statistic, known_aggregator in _STATISTICS:
+        if aggregator is known_aggregator:
+            return statistic
+    raise ValueError("{} can not be aggregated in a stream, only {} "
+                     "can".format(aggregator.name(),
+                                  ', '.join(known_aggregator.name()
+                                            for _, known_aggregator
+                                            in _STATISTICS)))
+
+
+class _PartialState(object):
+    """
+    The mergeable state of a statistic over part of a group: the count
+    of valid values, with their total, minimum and maximum, or their
+    mean and sum of squared deviations from it for Welford's algorithm,
+    as the statistics need.
+
+    Args:
+        data: a block of the group's data, masked or not.
+
+        axis: the axis of data to reduce.
+
+        components: the components of the state to keep.
+    """
+
+    def __init__(self, data, axis, components):
+        data = np.ma.asanyarray(data)
+        valid = ~np.ma.getmaskarray(data)
+        values = np.ma.getdata(data).astype(np.float64)
+        self.count = valid.sum(axis=axis)
+        self.total = None
+        self.minimum = None
+        self.maximum = None
+        self.mean = None
+        self.m2 = None
+        if 'total' in components or 'mean' in components:
+            total = np.where(valid, values, 0.).sum(axis=axis)
+            if 'total' in components:
+                self.total = total
+        if 'minimum' in components:
+            self.minimum = np.where(valid, values, np.inf).min(axis=axis)
+        if 'maximum' in components:
+            self.maximum = np.where(valid, values, -np.inf).max(axis=axis)
+        if 'mean' in components:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.mean = np.where(self.count > 0,
+                                     total / self.count, 0.)
+            deviations = values - np.expand_dims(self.mean, axis)
+            self.m2 = np.where(valid, deviations ** 2, 0.).sum(axis=axis)
+
+    def merge(self, other):
+        """
+        Merges the state of another part of the group into this one.
+        """
+        count = self.count + other.count
+        if self.total is not None:
+            self.total = self.total + other.total
+        if self.minimum is not None:
+            self.minimum = np.minimum(self.minimum, other.minimum)
+        if self.maximum is not None:
+            self.maximum = np.maximum(self.maximum, other.maximum)
+        if self.mean is not None:
+            # Chan et al.'s parallel form of Welford's algorithm.
+            delta = other.mean - self.mean
+            with np.errstate(invalid='ignore', divide='ignore'):
+                weight = np.where(count > 0, other.count / count, 0.)
+            self.m2 = self.m2 + other.m2 + \
+                delta ** 2 * self.count * weight
+            self.mean = self.mean + delta * weight
+        self.count = count
+
+    def result(self, statistic):
+        """
+        Finalises the state into a statistic of the group.
+
+        Args:
+            statistic: the statistic to compute, e.g. 'mean'.
+
+        Returns:
+            a masked array of the statistic, masked where there were too
+            few valid values to compute it.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if statistic == 'mean':
+                values = self.total / self.count
+                mask = self.count == 0
+            elif statistic == 'sum':
+                values = self.total
+                mask = self.count == 0
+            elif statistic == 'min':
+                values = self.minimum
+                mask = self.count == 0
+            elif statistic == 'max':
+                values = self.maximum
+                mask = self.count == 0
+            else:
+                values = self.m2 / (self.count - 1)
+                if statistic == 'std':
+                    values = np.sqrt(values)
+                mask = self.count <= 1
+        return np.ma.masked_array(np.where(mask, 0., values), mask=mask)
+
+
+def _group_ids(cube, template, coords):
+    """
+    Finds the index of the group of the template each point along the
+    aggregated dimension of cube belongs to, by matching the values of
+    the grouping coords.
+    """
+    combined_in = np.zeros(cube.coord(coords[0]).shape[0], dtype=np.int64)
+    combined_out = np.zeros(template.coord(coords[0]).shape[0],
+                            dtype=np.int64)
+    for coord in coords:
+        points_in = cube.coord(coord).points
+        points_out = template.coord(coord).points
+        values = np.unique(np.concatenate([points_in, points_out]))
+        combined_in = combined_in * len(values) + \
+            np.searchsorted(values, points_in)
+        combined_out = combined_out * len(values) + \
+            np.searchsorted(values, points_out)
+    order = np.argsort(combined_out, kind='stable')
+    return order[np.searchsorted(combined_out[order], combined_in)]
+
+
+def _group_index(group_ids):
+    """
+    Builds the index of the segments of each group along the aggregated
+    dimension, once for all the reductions over the groups.
+
+    Args:
+        group_ids: an array of the index of the group each point along
+        the aggregated dimension belongs to, e.g. from the categorical
+        coords of a cube.
+
+    Returns:
+        a _GroupIndex namedtuple of the order to take the points in so
+        that each group is contiguous, or None if they already are, and
+        the start and length of each group's segment in that order.
+    """
+    group_ids = np.asarray(group_ids)
+    order = None
+    if np.any(np.diff(group_ids) < 0):
+        order = np.argsort(group_ids, kind='stable')
+        group_ids = group_ids[order]
+    starts = np.flatnonzero(np.diff(group_ids, prepend=-1))
+    counts = np.diff(np.append(starts, len(group_ids)))
+    return _GroupIndex(order=order, starts=starts, counts=counts)
+
+
+def _segment_reduce(data, index, kernel, axis, dtype, views=False):
+    """
+    Reduces each group's segment of data along axis into one array with
+    the kernel. Segments are indexed as aggregated_by does, so each
+    group's values are reduced in the same order, or with views set,
+    contiguous segments are sliced as views of the data.
+    """
+    shape = list(data.shape)
+    shape[axis] = len(index.starts)
+    result = np.empty(shape, dtype=dtype)
+    front = (slice(None),) * axis
+    for group, (start, count) in enumerate(zip(index.starts,
+                                               index.counts)):
+        if index.order is not None:
+            segment = data[front + (index.order[start:start + count],)]
+        elif views:
+            segment = data[front + (slice(start, start + count),)]
+        else:
+            segment = data[front + (np.arange(start, start + count),)]
+        result[front + (group,)] = kernel(segment, axis)
+    return result
+
+
+def grouped_aggregated_by(cube, coords, aggregator):
+    """
+    Aggregates a cube by the given categorical coords like
+    cube.aggregated_by, building an index of the segment of each group
+    along the aggregated dimension once and reducing the segments with
+    plain numpy kernels straight into the result, rather than going
+    through the masked array functions and the stacking of the results
+    aggregated_by does for each group. The MEAN, SUM, MIN and MAX of
+    unmasked, realised data are computed this way; other aggregators,
+    masked and lazy data are left to aggregated_by. Given a list of
+    aggregators, the index is built once for all of them.
+
+    Args:
+        cube: the Cube to aggregate.
+
+        coords: a list of the names of the coords to group by, spanning
+        a single dimension.
+
+        aggregator: an iris aggregator, e.g. iris.analysis.MEAN, or a
+        list of them.
+
+    Returns:
+        the aggregated Cube, identical to the result of aggregated_by,
+        or a CubeList of one such Cube for each aggregator in a list.
+    """
+    if isinstance(aggregator, list):
+        aggregators = aggregator
+    else:
+        aggregators = [aggregator]
+    kernel_data = not cube.has_lazy_data() and \
+        not np.ma.isMaskedArray(cube.data)
+    axis = cube.coord_dims(cube.coord(coords[0]))[0]
+    index = None
+    results = []
+    for each in aggregators:
+        if not kernel_data or not streamable(each) or \
+                _statistic(each) not in _KERNELS:
+            results.append(cube.aggregated_by(coords, each))
+            continue
+        template = _grouped_template(cube, coords, each)
+        if index is None:
+            index = _group_index(_group_ids(cube, template, coords))
+        # The dtype aggregated_by gives the realised data, from one point.
+        dtype = each.aggregate(np.take(cube.data, [0], axis=axis),
+                               axis=axis).dtype
+        statistic = _statistic(each)
+        template.data = _segment_reduce(cube.data, index,
+                                        _KERNELS[statistic], axis, dtype,
+                                        views=statistic in _ORDER_FREE)
+        results.append(template)
+    if isinstance(aggregator, list):
+        return iris.cube.CubeList(results)
+    return results[0]
+
+
+def _grouped_template(cube, coords, aggregator):
+    """
+    Aggregates the coords and metadata of a cube by the given coords,
+    without aggregating its data where the version of iris allows
+    dataless cubes.
+    """
+    if hasattr(cube, 'is_dataless'):
+        template = cube.copy(data=np.broadcast_to(
+            np.zeros((), dtype=cube.dtype), cube.shape))
+        template.data = None
+    else:
+        template = cube.copy(data=cube.lazy_data())
+    return template.aggregated_by(coords, aggregator)
+
+
+def _block_bounds(cube, axis):
+    """
+    Lists the start and stop of each block of the cube's data along
+    axis, following the chunks of lazy data, i.e. the files it was
+    loaded from.
+    """
+    if cube.has_lazy_data():
+        lengths = cube.lazy_data().chunks[axis]
+    else:
+        lengths = (cube.shape[axis],)
+    stops = np.cumsum(lengths)
+    return zip(stops - np.asarray(lengths), stops)
+
+
+def streamed_aggregated_by(cube, coords, aggregator):
+    """
+    Aggregates a cube by the given categorical coords like
+    cube.aggregated_by, reading the data one block along the aggregated
+    dimension at a time rather than all at once. For a cube concatenated
+    from files, each block is one file's data. The partial states of the
+    groups in a block are merged into the states of the groups, so groups
+    spanning blocks, e.g. a DJF season spanning two files, are aggregated
+    correctly, and each group's state is finalised and released once its
+    last block has been read. Given a list of aggregators, the groups are
+    found once and every statistic is computed from the same single read
+    of the data.
+
+    Args:
+        cube: the Cube to aggregate, usually with lazy data.
+
+        coords: a list of the names of the coords to group by, spanning
+        a single dimension.
+
+        aggregator: one of iris.analysis.MEAN, SUM, MIN, MAX, VARIANCE
+        or STD_DEV, or a list of them.
+
+    Returns:
+        the aggregated Cube, with the same metadata and dtype as the
+        result of aggregated_by on the cube with lazy data, or a CubeList
+        of one such Cube for each aggregator in a list.
+    """
+    if isinstance(aggregator, list):
+        aggregators = aggregator
+    else:
+        aggregators = [aggregator]
+    statistics = [_statistic(each) for each in aggregators]
+    components = set()
+    for statistic in statistics:
+        components.update(_COMPONENTS[statistic])
+    lazy_cube = cube.copy(data=cube.lazy_data())
+    templates = [lazy_cube.aggregated_by(coords, each)
+                 for each in aggregators]
+    axis = cube.coord_dims(cube.coord(coords[0]))[0]
+    group_ids = _group_ids(cube, templates[0], coords)
+    last_index = np.zeros(templates[0].shape[axis], dtype=np.int64)
+    np.maximum.at(last_index, group_ids, np.arange(len(group_ids)))
+    results = [np.ma.masked_all(template.shape, dtype=template.dtype)
+               for template in templates]
+    masked = False
+    states = {}
+    data = cube.core_data()
+    for start, stop in _block_bounds(cube, axis):
+        index = (slice(None),) * axis + (slice(start, stop),)
+        block = data[index]
+        if hasattr(block, 'compute'):
+            block = block.compute()
+        masked = masked or np.ma.isMaskedArray(block)
+        block_ids = group_ids[start:stop]
+        for group in np.unique(block_ids):
+            members = np.flatnonzero(block_ids == group)
+            state = _PartialState(np.take(block, members, axis=axis), axis,
+                                  components)
+            if group in states:
+                states[group].merge(state)
+            else:
+                states[group] = state
+        for group in [group for group in states
+                      if last_index[group] < stop]:
+            state = states.pop(group)
+            for statistic, result in zip(statistics, results):
+                result[(slice(None),) * axis + (group,)] = \
+                    state.result(statistic)
+    for template, result in zip(templates, results):
+        if not masked and not np.ma.is_masked(result):
+            result = result.filled()
+        template.data = result
+    if isinstance(aggregator, list):
+        return iris.cube.CubeList(templates)
+    return templates[0]
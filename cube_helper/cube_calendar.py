@@ -0,0 +1,208 @@
+# (C) Crown Copyright, Met Office. All rights reserved.
+#
+# This file is part of cube_helper and is released under the
+# BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+from __future__ import (absolute_import, division, print_function)
+from collections import namedtuple
+import numpy as np
+import cftime
+import iris
+try:
+    from iris.common.mixin import Unit as _IrisUnit
+except ImportError:
+    _IrisUnit = None
+
+DateFields = namedtuple('DateFields', ['year',
+                                       'month',
+                                       'day',
+                                       'hour',
+                                       'minute',
+                                       'second',
+                                       'microsecond'])
+
+_US_PER_DAY = 86400 * 1000000
+
+_UNIT_FACTORS = {}
+for _names, _factor in ((('microseconds', 'microsecond', 'microsec',
+                          'microsecs', 'us'), 1),
+                        (('milliseconds', 'millisecond', 'millisec',
+                          'millisecs', 'msec', 'msecs', 'ms'), 1000),
+                        (('seconds', 'second', 'sec', 'secs', 's'),
+                         1000000),
+                        (('minutes', 'minute', 'min', 'mins'),
+                         60 * 1000000),
+                        (('hours', 'hour', 'hr', 'hrs', 'h'),
+                         3600 * 1000000),
+                        (('days', 'day', 'd'), _US_PER_DAY)):
+    for _name in _names:
+        _UNIT_FACTORS[_name] = _factor
+
+_DAYS_BEFORE_MONTH = {
+    365: np.array([0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]),
+    366: np.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335])}
+
+_FIXED_LENGTH_CALENDARS = {'360_day': 360,
+                           'noleap': 365,
+                           '365_day': 365,
+                           'all_leap': 366,
+                           '366_day': 366}
+
+_GREGORIAN_CALENDARS = ('standard', 'gregorian', 'proleptic_gregorian')
+
+# The first day of the Gregorian calendar in the mixed standard calendar.
+_GREGORIAN_START = (1582, 10, 15)
+
+
+def _rounds_to_seconds(units):
+    """
+    Whether iris rounds dates from these units to the nearest second, as
+    it does under its legacy date precision.
+    """
+    return _IrisUnit is not None and isinstance(units, _IrisUnit) and \
+        not getattr(iris.FUTURE, 'date_microseconds', False)
+
+
+def _to_microseconds(points, factor):
+    """
+    Scales time points to integer microseconds, rounding in the same way
+    as cftime.num2date.
+    """
+    if points.dtype.kind in 'iu':
+        return points.astype(np.int64) * factor
+    scaled = points.astype(np.longdouble) * factor
+    result = np.rint(scaled).astype(np.int64)
+    if factor > 1000:
+        result = np.where(result % 1000000 == 1,
+                          np.floor(scaled).astype(np.int64), result)
+        result = np.where(result % 1000000 == 999999,
+                          np.ceil(scaled).astype(np.int64), result)
+    return result
+
+
+def _days_from_civil(year, month, day):
+    """
+    Counts days since 1970-01-01 in the proleptic Gregorian calendar
+    with astronomical year numbering.
+    """
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + \
+        day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - \
+        year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def _civil_from_days(days):
+    """
+    Inverse of _days_from_civil.
+    """
+    days = days + 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 -
+                   day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 -
+                                year_of_era // 100)
+    month_phase = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * month_phase + 2) // 5 + 1
+    month = month_phase + np.where(month_phase < 10, 3, -9)
+    year = year_of_era + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def _days_from_fixed(year, month, day, year_length):
+    if year_length == 360:
+        return year * 360 + (month - 1) * 30 + day - 1
+    return year * year_length + \
+        _DAYS_BEFORE_MONTH[year_length][month - 1] + day - 1
+
+
+def _fixed_from_days(days, year_length):
+    year = days // year_length
+    day_of_year = days - year * year_length
+    if year_length == 360:
+        return year, day_of_year // 30 + 1, day_of_year % 30 + 1
+    cumulative = _DAYS_BEFORE_MONTH[year_length]
+    month = np.searchsorted(cumulative, day_of_year, side='right')
+    day = day_of_year - cumulative[month - 1] + 1
+    return year, month, day
+
+
+def _fields_from_dates(dates):
+    dates = np.asarray(dates).ravel()
+    return DateFields(*[np.array([getattr(date, field) for date in dates],
+                                 dtype=np.int64)
+                        for field in DateFields._fields])
+
+
+def _reshape(fields, shape):
+    return DateFields(*[field.reshape(shape) for field in fields])
+
+
+def _date_fields(points, units):
+    """
+    Converts time points into integer date and time fields, using
+    integer arithmetic for the 360_day, noleap, all_leap and Gregorian
+    calendars rather than building a datetime object for every point.
+    The results are identical to the fields of units.num2date(points),
+    which is fallen back on for other calendars and for dates the
+    arithmetic does not cover, i.e. before the Gregorian reform in the
+    standard calendar.
+
+    Args:
+        points: an array of time values.
+
+        units: the cf_units.Unit the time values are in.
+
+    Returns:
+        a DateFields namedtuple of int64 arrays the shape of points.
+    """
+    points = np.asarray(points)
+    calendar = units.calendar
+    unit_name = units.cftime_unit.split(' since ')[0].strip().lower()
+    factor = _UNIT_FACTORS.get(unit_name)
+    if factor is None or (calendar not in _FIXED_LENGTH_CALENDARS and
+                          calendar not in _GREGORIAN_CALENDARS) or \
+            points.dtype.kind not in 'iuf' or \
+            not np.isfinite(points).all():
+        return _reshape(_fields_from_dates(units.num2date(points)),
+                        points.shape)
+    epoch = cftime.num2date(0, units.cftime_unit, calendar)
+    epoch_us = ((epoch.hour * 60 + epoch.minute) * 60 + epoch.second) * \
+        1000000 + epoch.microsecond
+    total_us = _to_microseconds(points.ravel(), factor) + epoch_us
+    if _rounds_to_seconds(units):
+        total_us = (total_us + 500000) // 1000000 * 1000000
+    days = total_us // _US_PER_DAY
+    day_us = total_us - days * _US_PER_DAY
+    if calendar in _FIXED_LENGTH_CALENDARS:
+        year_length = _FIXED_LENGTH_CALENDARS[calendar]
+        days = days + _days_from_fixed(epoch.year, epoch.month, epoch.day,
+                                       year_length)
+        year, month, day = _fixed_from_days(days, year_length)
+    else:
+        days = days + _days_from_civil(epoch.year, epoch.month, epoch.day)
+        year, month, day = _civil_from_days(days)
+        if calendar == 'proleptic_gregorian':
+            first_date = (1, 1, 1)
+        else:
+            first_date = _GREGORIAN_START
+        if (epoch.year, epoch.month, epoch.day) < first_date or \
+                days.size and days.min() < _days_from_civil(*first_date):
+            return _reshape(_fields_from_dates(units.num2date(points)),
+                            points.shape)
+    seconds = day_us // 1000000
+    fields = DateFields(year=year,
+                        month=month,
+                        day=day,
+                        hour=seconds // 3600,
+                        minute=seconds // 60 % 60,
+                        second=seconds % 60,
+                        microsecond=day_us % 1000000)
+    return _reshape(DateFields(*[np.asarray(field, dtype=np.int64)
+                                 for field in fields]),
+                    points.shape)
@@ -0,0 +1,206 @@
+# (C) Crown Copyright, Met Office. All rights reserved.
+#
+# This file is part of cube_helper and is released under the
+# BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+from __future__ import (absolute_import, division, print_function)
+import os
+import stat
+import glob
+import json
+import tempfile
+import numpy as np
+import cf_units
+from cube_helper.cube_scanner import FileMetadata, CoordMetadata, scan_file
+
+_CATALOG_VERSION = 2
+
+
+def _encode_value(value):
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__': value.tolist(), 'dtype': str(value.dtype)}
+    elif isinstance(value, np.generic):
+        return value.item()
+    else:
+        return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and '__ndarray__' in value:
+        return np.array(value['__ndarray__'], dtype=value['dtype'])
+    else:
+        return value
+
+
+def _record_to_dict(record):
+    """
+    Converts a FileMetadata record into a JSON serialisable dict.
+    """
+    time_units = None
+    if record.time_units is not None:
+        time_units = [record.time_units.origin, record.time_units.calendar]
+    return {'path': record.path,
+            'var_name': record.var_name,
+            'standard_name': record.standard_name,
+            'long_name': record.long_name,
+            'units': record.units,
+            'shape': list(record.shape),
+            'dtype': str(record.dtype),
+            'dim_coords': [list(coord) for coord in record.dim_coords],
+            'aux_coords': [list(coord) for coord in record.aux_coords],
+            'attributes': {key: _encode_value(value)
+                           for key, value in record.attributes.items()},
+            'time_units': time_units,
+            'time_start': _encode_value(record.time_start),
+            'time_end': _encode_value(record.time_end),
+            'time_bounds': record.time_bounds}
+
+
+def _coord_from_list(coord):
+    var_name, standard_name, long_name, units, shape = coord
+    return CoordMetadata(var_name, standard_name, long_name, units,
+                         tuple(shape))
+
+
+def _record_from_dict(record):
+    """
+    Converts a dict written by _record_to_dict back into a FileMetadata
+    record.
+    """
+    time_units = None
+    if record['time_units'] is not None:
+        time_units = cf_units.Unit(*record['time_units'])
+    return FileMetadata(
+        path=record['path'],
+        var_name=record['var_name'],
+        standard_name=record['standard_name'],
+        long_name=record['long_name'],
+        units=record['units'],
+        shape=tuple(record['shape']),
+        dtype=np.dtype(record['dtype']),
+        dim_coords=tuple(_coord_from_list(c) for c in record['dim_coords']),
+        aux_coords=tuple(_coord_from_list(c) for c in record['aux_coords']),
+        attributes={key: _decode_value(value)
+                    for key, value in record['attributes'].items()},
+        time_units=time_units,
+        time_start=record['time_start'],
+        time_end=record['time_end'],
+        time_bounds=record['time_bounds'])
+
+
+def _replace_file(tmp_name, filename):
+    """
+    Moves a temporary file over filename atomically. The temporary file
+    is first given the mode of the file it replaces, or the mode the
+    umask gives new files, rather than the owner only mode of mkstemp,
+    so files shared between users stay readable by them.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(tmp_name, mode)
+    os.replace(tmp_name, filename)
+
+
+class Catalog(object):
+    """
+    A persistent on-disk catalog of scanned directories and file
+    metadata, stored as JSON. Directory listings are reused for as long
+    as the directory's mtime is unchanged, and file metadata for as long
+    as the file's size and mtime are unchanged, so repeated loads of an
+    unchanged directory neither glob nor read any file headers.
+
+    Args:
+        filename: the JSON file to keep the catalog in. It is created
+        on the first call to save() if it does not already exist.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._directories = {}
+        self._files = {}
+        self._records = {}
+        self._changed = False
+        if os.path.exists(filename):
+            with open(filename) as catalog_file:
+                contents = json.load(catalog_file)
+            if contents.get('version') == _CATALOG_VERSION:
+                self._directories = contents['directories']
+                self._files = contents['files']
+
+    def paths(self, directory, filetype):
+        """
+        Lists the files of a given type in a directory.
+
+        Args:
+            directory: the directory to list, ending in a forward slash.
+
+            filetype: the extension of the files to list.
+
+        Returns:
+            a list of the matching filenames.
+        """
+        pattern = directory + '*' + filetype
+        mtime = os.stat(directory).st_mtime
+        entry = self._directories.get(pattern)
+        if entry is None or entry['mtime'] != mtime:
+            entry = {'mtime': mtime, 'paths': glob.glob(pattern)}
+            self._directories[pattern] = entry
+            self._changed = True
+        return list(entry['paths'])
+
+    def records(self, path):
+        """
+        Gets the header metadata of a file, only scanning the file if it
+        is new to the catalog or its size or mtime have changed.
+
+        Args:
+            path: the file to get the metadata of.
+
+        Returns:
+            a list of FileMetadata records, or None if the file could not
+            be scanned, e.g. as it is not a netCDF file.
+        """
+        stat = os.stat(path)
+        entry = self._files.get(path)
+        if entry is None or entry['size'] != stat.st_size or \
+                entry['mtime'] != stat.st_mtime:
+            try:
+                records = scan_file(path)
+            except (IOError, OSError):
+                records = None
+            entry = {'size': stat.st_size,
+                     'mtime': stat.st_mtime,
+                     'records': None if records is None else
+                     [_record_to_dict(record) for record in records]}
+            self._files[path] = entry
+            self._records[path] = records
+            self._changed = True
+        elif path not in self._records:
+            if entry['records'] is None:
+                self._records[path] = None
+            else:
+                self._records[path] = [_record_from_dict(record)
+                                       for record in entry['records']]
+        return self._records[path]
+
+    def save(self):
+        """
+        Writes the catalog to its file if anything has changed. The file
+        is replaced atomically so concurrent readers never see a partial
+        catalog.
+        """
+        if not self._changed:
+            return
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        handle, tmp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as catalog_file:
+            json.dump({'version': _CATALOG_VERSION,
+                       'directories': self._directories,
+                       'files': self._files}, catalog_file)
+        _replace_file(tmp_name, self.filename)
+        self._changed = False
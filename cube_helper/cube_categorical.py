@@ -0,0 +1,365 @@
+# (C) Crown Copyright, Met Office. All rights reserved.
+#
+# This file is part of cube_helper and is released under the
+# BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+from __future__ import (absolute_import, division, print_function)
+import calendar
+import threading
+import warnings
+from collections import OrderedDict
+import numpy as np
+import cftime
+import iris
+import iris.coord_categorisation
+from cube_helper.cube_equaliser import _array_digest
+from cube_helper.cube_calendar import (_date_fields,
+                                       _days_from_civil,
+                                       _days_from_fixed,
+                                       _DAYS_BEFORE_MONTH,
+                                       _FIXED_LENGTH_CALENDARS,
+                                       _GREGORIAN_START)
+try:
+    from iris.warnings import IrisSaveWarning as _SaveWarning
+except ImportError:
+    _SaveWarning = UserWarning
+
+_MONTH_FULLNAMES = np.array([calendar.month_name[month]
+                             for month in range(13)], dtype='|U64')
+
+_MONTH_ABBRS = np.array([calendar.month_abbr[month]
+                         for month in range(13)], dtype='|U64')
+
+_WEEKDAY_FULLNAMES = np.array([calendar.day_name[day]
+                               for day in range(7)], dtype='|U64')
+
+_WEEKDAY_ABBRS = np.array([calendar.day_abbr[day]
+                           for day in range(7)], dtype='|U64')
+
+_SEASONAL = ('season', 'season_number', 'season_year')
+
+# The number of date fields and categorical point arrays kept for reuse.
+_CACHE_SIZE = 32
+
+
+def _months_in_season(season):
+    cyclic_months = 'jfmamjjasondjfmamjjasond'
+    first = cyclic_months.find(season.lower())
+    if first < 0:
+        raise ValueError("unrecognised season: {!s}".format(season))
+    return [(month % 12) + 1
+            for month in range(first, first + len(season))]
+
+
+def _validate_seasons(seasons):
+    counts = np.zeros(13, dtype=int)
+    for season in seasons:
+        counts[_months_in_season(season)] += 1
+    not_present = [calendar.month_abbr[month] for month in range(1, 13)
+                   if counts[month] == 0]
+    if not_present:
+        raise ValueError("some months do not appear in any season: "
+                         "{!s}".format(", ".join(not_present)))
+    multi_present = [calendar.month_abbr[month] for month in range(1, 13)
+                     if counts[month] > 1]
+    if multi_present:
+        raise ValueError("some months appear in more than one season: "
+                         "{!s}".format(", ".join(multi_present)))
+
+
+def _month_season_numbers(seasons):
+    _validate_seasons(seasons)
+    numbers = np.zeros(13, dtype=int)
+    for number, season in enumerate(seasons):
+        numbers[_months_in_season(season)] = number
+    return numbers
+
+
+def _month_year_adjusts(seasons):
+    _validate_seasons(seasons)
+    adjusts = np.zeros(13, dtype=int)
+    for season in seasons:
+        months = np.array(_months_in_season(season))
+        adjusts[months[months > months[-1]]] = 1
+    return adjusts
+
+
+def _vectorisable(fields, units):
+    """
+    Whether the day of year and weekday of dates can be worked out from
+    their fields with integer arithmetic, i.e. whether their calendar
+    has fixed length years or they fall in the Gregorian calendar.
+    """
+    if units.calendar in _FIXED_LENGTH_CALENDARS or \
+            units.calendar == 'proleptic_gregorian':
+        return True
+    if units.calendar not in ('standard', 'gregorian'):
+        return False
+    return not fields.year.size or \
+        _days_from_civil(fields.year, fields.month, fields.day).min() >= \
+        _days_from_civil(*_GREGORIAN_START)
+
+
+def _day_numbers(year, month, day, calendar_name):
+    if calendar_name in _FIXED_LENGTH_CALENDARS:
+        return _days_from_fixed(year, month, day,
+                                _FIXED_LENGTH_CALENDARS[calendar_name])
+    return _days_from_civil(year, month, day)
+
+
+def _day_of_year(fields, units, season=None, seasons=None):
+    if units.calendar in _FIXED_LENGTH_CALENDARS:
+        year_length = _FIXED_LENGTH_CALENDARS[units.calendar]
+        if year_length == 360:
+            return (fields.month - 1) * 30 + fields.day
+        return _DAYS_BEFORE_MONTH[year_length][fields.month - 1] + \
+            fields.day
+    return _days_from_civil(fields.year, fields.month, fields.day) - \
+        _days_from_civil(fields.year, 1, 1) + 1
+
+
+def _weekday_number(fields, units, season=None, seasons=None):
+    # Weekdays advance by one a day in every calendar, so are counted on
+    # from the weekday cftime gives a reference date.
+    reference = cftime.datetime(2000, 1, 1, calendar=units.calendar)
+    days = _day_numbers(fields.year, fields.month, fields.day,
+                        units.calendar) - \
+        _day_numbers(2000, 1, 1, units.calendar)
+    return (days + reference.dayofwk) % 7
+
+
+def _year(fields, units, season, seasons):
+    return fields.year
+
+
+def _month_number(fields, units, season, seasons):
+    return fields.month
+
+
+def _month_fullname(fields, units, season, seasons):
+    return _MONTH_FULLNAMES[fields.month]
+
+
+def _month(fields, units, season, seasons):
+    return _MONTH_ABBRS[fields.month]
+
+
+def _day_of_month(fields, units, season, seasons):
+    return fields.day
+
+
+def _weekday_fullname(fields, units, season, seasons):
+    return _WEEKDAY_FULLNAMES[_weekday_number(fields, units)]
+
+
+def _weekday(fields, units, season, seasons):
+    return _WEEKDAY_ABBRS[_weekday_number(fields, units)]
+
+
+def _hour(fields, units, season, seasons):
+    return fields.hour
+
+
+def _season(fields, units, season, seasons):
+    return np.array(seasons, dtype='|U64')[
+        _month_season_numbers(seasons)[fields.month]]
+
+
+def _season_number(fields, units, season, seasons):
+    return _month_season_numbers(seasons)[fields.month]
+
+
+def _season_year(fields, units, season, seasons):
+    return fields.year + _month_year_adjusts(seasons)[fields.month]
+
+
+def _season_membership(fields, units, season, seasons):
+    return np.isin(fields.month, _months_in_season(season))
+
+
+# Each categorisation gives the points of the categorical coordinate from
+# the date fields of the time coordinate, and the units of the points.
+_CATEGORISATIONS = {
+    'year': (_year, '1'),
+    'month_number': (_month_number, '1'),
+    'month_fullname': (_month_fullname, 'no_unit'),
+    'month': (_month, 'no_unit'),
+    'day_of_month': (_day_of_month, '1'),
+    'day_of_year': (_day_of_year, '1'),
+    'weekday_number': (_weekday_number, '1'),
+    'weekday_fullname': (_weekday_fullname, 'no_unit'),
+    'weekday': (_weekday, 'no_unit'),
+    'hour': (_hour, '1'),
+    'season': (_season, 'no_unit'),
+    'season_number': (_season_number, '1'),
+    'season_year': (_season_year, '1'),
+    'season_membership': (_season_membership, '1')}
+
+# The iris categorisations, used for the day of year and weekday of dates
+# integer arithmetic does not cover.
+_IRIS_CATEGORISATIONS = {
+    'day_of_year': iris.coord_categorisation.add_day_of_year,
+    'weekday_number': iris.coord_categorisation.add_weekday_number,
+    'weekday_fullname': iris.coord_categorisation.add_weekday_fullname,
+    'weekday': iris.coord_categorisation.add_weekday}
+
+
+class _LRUCache(object):
+    """
+    A thread safe mapping holding at most maxsize items, evicting the
+    least recently used item when full.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is not None:
+                self._items[key] = value
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = value
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+_CACHE = _LRUCache(_CACHE_SIZE)
+
+
+def time_fingerprint(coord):
+    """
+    Reduces a time coordinate to a hashable fingerprint of its points,
+    units and calendar, under which the categoricals derived from it are
+    cached. Coordinates with the same fingerprint, e.g. those of many
+    variables from one run, share the cached categoricals.
+
+    Args:
+        coord: an iris time coordinate.
+
+    Returns:
+        a hashable fingerprint of the coordinate.
+    """
+    return (coord.shape, _array_digest(coord.points), str(coord.units),
+            coord.units.calendar,
+            getattr(iris.FUTURE, 'date_microseconds', False))
+
+
+def clear_categorical_cache():
+    """
+    Empties the cache of date fields and categorical coordinate points.
+    """
+    _CACHE.clear()
+
+
+def coord_date_fields(coord, fingerprint=None):
+    """
+    Converts the points of a time coordinate into integer date and time
+    fields, once for all the categoricals derived from them. The fields
+    are cached by the fingerprint of the coordinate.
+
+    Args:
+        coord: an iris time coordinate.
+
+        fingerprint (optional): the time_fingerprint of coord, if
+        already known.
+
+    Returns:
+        a DateFields namedtuple of int64 arrays the shape of the points.
+    """
+    if fingerprint is None:
+        fingerprint = time_fingerprint(coord)
+    key = (fingerprint, 'fields')
+    fields = _CACHE.get(key)
+    if fields is None:
+        fields = _date_fields(coord.points, coord.units)
+        _CACHE.put(key, fields)
+    return fields
+
+
+def add_categorised(cube, coord, category, name=None, season='djf',
+                    seasons=('djf', 'mam', 'jja', 'son'), fingerprint=None):
+    """
+    Adds a categorical coordinate to a cube, derived from integer date
+    fields of the time coordinate with array arithmetic instead of a
+    Python call for each point. The coordinate added is identical to the
+    one the respective iris.coord_categorisation function adds. The
+    points of the coordinate are cached by the fingerprint of the time
+    coordinate and the categorisation, and reused for time coordinates
+    with the same fingerprint.
+
+    Args:
+        cube: the Cube to add the categorical coordinate to.
+
+        coord: the time coordinate, or the name of it, to categorise.
+
+        category: the categorisation, e.g. 'year' or 'season'.
+
+        name (optional): the name of the coordinate to add. Set to
+        category by default.
+
+        season (optional): the season of a season_membership
+        categorisation.
+
+        seasons (optional): the seasons of a season, season_number or
+        season_year categorisation.
+
+        fingerprint (optional): the time_fingerprint of coord, if
+        already known.
+    """
+    if name is None:
+        name = category
+    if not isinstance(coord, iris.coords.Coord):
+        coord = cube.coord(coord)
+    if cube.coords(name):
+        raise ValueError('A coordinate "{}" already exists in the '
+                         'cube.'.format(name))
+    if category == 'season_membership':
+        warnings.warn("The 'season_membership' coordinate is a boolean "
+                      "and will not be saveable to a NetCDF file. If you "
+                      "need to save the file you can convert them to "
+                      "integers using coord.points = "
+                      "coord.points.astype(int)",
+                      category=_SaveWarning)
+    if fingerprint is None:
+        fingerprint = time_fingerprint(coord)
+    key = (fingerprint, category,
+           season if category == 'season_membership' else None,
+           tuple(seasons) if category in _SEASONAL else None)
+    cached = _CACHE.get(key)
+    if cached is None:
+        categorise, units = _CATEGORISATIONS[category]
+        fields = coord_date_fields(coord, fingerprint)
+        if category in _IRIS_CATEGORISATIONS and \
+                not _vectorisable(fields, coord.units):
+            _IRIS_CATEGORISATIONS[category](cube, coord, name=name)
+            points = cube.coord(name).points
+        else:
+            points = np.asarray(categorise(fields, coord.units, season,
+                                           seasons))
+        points = points.copy()
+        points.setflags(write=False)
+        cached = (points, units)
+        _CACHE.put(key, cached)
+        if cube.coords(name):
+            return
+    points, units = cached
+    new_coord = iris.coords.AuxCoord(points.copy(),
+                                     units=units,
+                                     attributes=coord.attributes.copy())
+    new_coord.rename(name)
+    cube.add_aux_coord(new_coord, cube.coord_dims(coord))
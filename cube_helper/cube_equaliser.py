@@ -5,12 +5,97 @@
 # See LICENSE in the root of the repository for full licensing details.
 
 from __future__ import (absolute_import, division, print_function)
+import os
 import sys
+import json
+import hashlib
+import tempfile
 import numpy as np
-from iris.util import unify_time_units
-from collections import namedtuple
-from itertools import combinations
+import cf_units
+from iris.coords import AuxCoord, DimCoord
+from collections import namedtuple, OrderedDict
 from cube_helper.logger import log_module, log_inconsistent, log_coord_remove
+from cube_helper.cube_catalog import (_encode_value,
+                                      _decode_value,
+                                      _replace_file)
+
+_Signature = namedtuple('Signature', ['ndim',
+                                      'aux_coords',
+                                      'dim_coords',
+                                      'attributes',
+                                      'time_units'])
+
+_CAST_BLOCK_BYTES = 2 ** 24
+
+_PLAN_VERSION = 1
+
+_Survey = namedtuple('Survey', ['signatures',
+                                'aux_indexes',
+                                'dim_indexes',
+                                'attribute_items',
+                                'time_coords',
+                                'groups'])
+
+TimeExtentReport = namedtuple('TimeExtentReport', ['overlaps',
+                                                   'gaps',
+                                                   'duplicates',
+                                                   'cube_files'])
+
+
+def _attribute_item(key, value):
+    """
+    Makes a hashable (key, value) item of a cube attribute, digesting
+    ndarray values into their dtype, shape and bytes.
+    """
+    if isinstance(value, np.ndarray):
+        value = (value.dtype.str, value.shape, value.tobytes())
+    return key, value
+
+
+def _hashable(value):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def _attributes_key(attributes):
+    """
+    Reduces an attributes dict to a hashable frozenset of its items.
+    """
+    return frozenset(_hashable(_attribute_item(key, value))
+                     for key, value in attributes.items())
+
+
+def _attribute_items(cube):
+    return {_attribute_item(key, value)
+            for key, value in cube.attributes.items()}
+
+
+def _uncommon_attribute_keys(item_sets):
+    """
+    Finds the keys of the attributes which are not common to all cubes,
+    given the attribute items of each cube.
+    """
+    uncommon_keys = set()
+    if len(item_sets) > 1:
+        # An attribute differs between some pair of cubes exactly when
+        # some cubes have it and others don't.
+        common_items = set.intersection(*item_sets)
+        for key, _ in set.union(*item_sets) - common_items:
+            uncommon_keys.add(key)
+    return uncommon_keys
+
+
+def _remove_attribute_keys(cubes, uncommon_keys):
+    for key in uncommon_keys:
+        for cube in cubes:
+            try:
+                del cube.attributes[key]
+            except KeyError:
+                pass
+    log_coord_remove(list(uncommon_keys), 'attributes')
 
 
 def equalise_attributes(cubes, comp_only=False):
@@ -31,40 +116,139 @@ def equalise_attributes(cubes, comp_only=False):
         Equalised cube_dataset to the CubeHelp class
 
     """
-    uncommon_keys = set()
-    attr_dict_list = []
-    attr_dict = {}
-    for cube in cubes:
-        for key, value in cube.attributes.items():
-            if isinstance(value, np.ndarray):
-                value = str(value)
-                attr_dict.update({key: value})
-            else:
-                attr_dict.update({key: value})
-        attr_dict_list.append(attr_dict.items())
-        attr_dict = {}
-    combs = list(combinations(attr_dict_list, 2))
-    for element in combs:
-        for key in set(element[0]) ^ set(element[1]):
-            uncommon_keys.add(key[0])
-
+    uncommon_keys = _uncommon_attribute_keys(
+        [_attribute_items(cube) for cube in cubes])
     if not comp_only:
-        for key in uncommon_keys:
-            for cube in cubes:
-                try:
-                    del cube.attributes[key]
-                except KeyError:
-                    pass
-        log_coord_remove(list(uncommon_keys), 'attributes')
+        _remove_attribute_keys(cubes, uncommon_keys)
     else:
         log_inconsistent(list(uncommon_keys), 'attibutes')
     return cubes
 
 
-def equalise_time_units(cubes, comp_only=False):
+def _convert_time_coord(coord, units, lazy=False):
+    """
+    Converts the points and bounds of a time coordinate to float64 in
+    another time unit of the same calendar. Such a conversion is linear,
+    so its scale and offset are worked out once and applied to the whole
+    of the points and bounds.
+
+    Args:
+        coord: the time coordinate to convert.
+
+        units: the cf_units.Unit to convert to.
+
+        lazy (optional): if True, the conversion of auxiliary coordinates
+        is deferred by converting their lazy points and bounds. Dimension
+        coordinates always have real points, so are converted at once.
+    """
+    if lazy and not isinstance(coord, DimCoord):
+        points = coord.lazy_points()
+        bounds = coord.lazy_bounds()
+    else:
+        points = coord.points
+        bounds = coord.bounds
+    # As iris.util.unify_time_units does, the values are cast to float64
+    # whether or not they need converting, so the time coords of every
+    # cube end up with the same dtype.
+    points = points.astype(np.float64)
+    if bounds is not None:
+        bounds = bounds.astype(np.float64)
+    if coord.units != units:
+        offset = coord.units.convert(0., units)
+        scale = coord.units.convert(1., units) - offset
+        points = points * scale + offset
+        if bounds is not None:
+            bounds = bounds * scale + offset
+    coord.points = points
+    if bounds is not None:
+        coord.bounds = bounds
+    coord.units = units
+
+
+def _time_coords(cube):
+    return [coord for coord in cube.coords()
+            if coord.units.is_time_reference()]
+
+
+def _time_conversions(time_coords, epochs):
+    """
+    Lists the (coord, units) conversions unifying time units. Every time
+    coord of a calendar is converted to the units of its epoch, cast to
+    float64 on the way, if any of the coords of that calendar need
+    converting.
+
+    Args:
+        time_coords: a list of the time reference coords of each cube.
+
+        epochs: a dict of the units to convert time coords to, by
+        calendar, to which the units of the first coord of any other
+        calendar are added.
+    """
+    calendar_coords = OrderedDict()
+    for coords in time_coords:
+        for time_coord in coords:
+            calendar = time_coord.units.calendar
+            epochs.setdefault(calendar, time_coord.units)
+            calendar_coords.setdefault(calendar, []).append(time_coord)
+    conversions = []
+    for calendar, coords in calendar_coords.items():
+        if any(time_coord.units != epochs[calendar]
+               for time_coord in coords):
+            conversions.extend((time_coord, epochs[calendar])
+                               for time_coord in coords)
+    return conversions
+
+
+def _time_unit_changes(time_coords, origin, calendar):
+    """
+    Works out how to unify time units without converting anything. The
+    time coordinates of each calendar are to be converted to the units
+    of the first coordinate of that calendar.
+
+    Args:
+        time_coords: a list of the time reference coords of each cube.
+
+        origin: the time origin of the first cube's time coordinate.
+
+        calendar: the calendar of the first cube's time coordinate.
+
+    Returns:
+        comp_messages, change_messages, conversions: the messages to log
+        when comparing and when equalising, and a list of the (coord,
+        units) conversions to make.
+    """
+    comp_messages = set()
+    change_messages = set()
+    for coords in time_coords:
+        for time_coord in coords:
+            if time_coord.units.calendar != calendar:
+                comp_messages.add("\tcalendar format inconsistent\n")
+            if time_coord.units.origin != origin:
+                comp_messages.add("\ttime start date inconsistent\n")
+                change_messages.add("New time origin set to "
+                                    "{}\n".format(origin))
+    conversions = _time_conversions(time_coords, {})
+    return comp_messages, change_messages, conversions
+
+
+def _log_messages(messages):
+    logger = log_module()
+    for message in messages:
+        logger.info(message)
+
+
+def _apply_time_unit_changes(change_messages, conversions, lazy=False):
+    for time_coord, units in conversions:
+        _convert_time_coord(time_coord, units, lazy)
+    _log_messages(change_messages)
+
+
+def equalise_time_units(cubes, comp_only=False, lazy=False):
     """
     Equalises time units by cycling through each cube in the given CubeList
-    or list of loaded cubes.
+    or list of loaded cubes. The time coordinates of each calendar are
+    converted to the units of the first coordinate of that calendar,
+    touching each coordinate once.
 
     Args:
         cubes: Cubes to equalised of time coords.
@@ -73,135 +257,268 @@ def equalise_time_units(cubes, comp_only=False):
         the cubes time_coordinates and print inconsistencies but not
         equalise them.
 
+        lazy: A boolean value, if set to True the conversion of
+        auxiliary time coordinates is deferred until their points are
+        needed.
+
     Returns:
         cubes with time coordinates unified.
     """
-    logger = log_module()
-    comp_messages = set()
-    change_messages = set()
-    calendar = cubes[0].coord('time').units.calendar
-    origin = cubes[0].coord('time').units.origin
-    for cube in cubes:
-        for time_coord in cube.coords():
-            if time_coord.units.is_time_reference():
-                if comp_only:
-                    if time_coord.units.calendar != calendar:
-                        comp_messages.add("\tcalendar format inconsistent\n")
-                    if time_coord.units.origin != origin:
-                        comp_messages.add("\ttime start date inconsistent\n")
-                else:
-                    if origin != time_coord.units.origin:
-                        change_messages.add("New time origin set to "
-                                            "{}\n".format(origin))
-                        unify_time_units(cubes)
-    if comp_messages:
-        for message in comp_messages:
-            logger.info(message)
-    if change_messages:
-        for message in change_messages:
-            logger.info(message)
-
+    comp_messages, change_messages, conversions = _time_unit_changes(
+        [_time_coords(cube) for cube in cubes],
+        cubes[0].coord('time').units.origin,
+        cubes[0].coord('time').units.calendar)
+    if comp_only:
+        _log_messages(comp_messages)
+    else:
+        _apply_time_unit_changes(change_messages, conversions, lazy)
     return cubes
 
 
-def equalise_data_type(cubes, data_type='float32'):
+def _cast_in_place(array, dtype):
+    """
+    Casts a real array to a dtype no wider than its own by writing the
+    cast values over its own memory a block at a time, so the cast never
+    needs a second full size array. Arrays which can't be cast in place
+    are cast with astype.
+
+    Args:
+        array: the numpy array, or masked array, to cast.
+
+        dtype: the numpy dtype to cast to.
+
+    Returns:
+        the cast array, a view of the memory of the original.
+    """
+    if np.ma.isMaskedArray(array):
+        return np.ma.masked_array(_cast_in_place(array.data, dtype),
+                                  mask=array.mask)
+    if dtype.itemsize > array.dtype.itemsize or \
+            not array.flags.c_contiguous or not array.flags.writeable:
+        return array.astype(dtype)
+    flat = array.reshape(-1)
+    cast = flat.view(np.uint8)[:flat.size * dtype.itemsize].view(dtype)
+    # Each block is written over bytes of the blocks already read.
+    block_size = max(1, _CAST_BLOCK_BYTES // array.dtype.itemsize)
+    for start in range(0, flat.size, block_size):
+        cast[start:start + block_size] = flat[start:start + block_size]
+    return cast.reshape(array.shape)
+
+
+def equalise_data_type(cubes, data_type='float32', in_place=False,
+                       casting='unsafe'):
     """
     Casts datatypes in iris numpy array to be of the same datatype.
+    The cast is deferred for cubes with lazy data, so no data is
+    realised, and cubes already of the datatype are left untouched.
 
     Args:
         cubes: Cubes to have their datatypes equalised.
-        data_type: String specifying datatype, default is float32.
+        data_type: String specifying datatype, default is float32. Any
+        numpy datatype is accepted, or 'common' for the smallest
+        datatype all the cubes' data can be cast to without loss,
+        worked out from their dtypes alone.
+        in_place: A boolean value, if set to True the data of cubes with
+        real data is cast over its own memory where the new datatype is
+        no wider, instead of into a copy. Any other references to the
+        data will see the cast values.
+        casting: The numpy casting rule the casts must follow, e.g.
+        'same_kind' to allow float64 to float32 but not float to int.
+        Set to 'unsafe' by default.
 
 
     Returns:
         cubes: Cubes with their data types identical.
     """
     logger = log_module()
-    if data_type == 'float32':
-        for cube in cubes:
-            cube.data = np.float32(cube.data)
-    elif data_type == 'float64':
-        for cube in cubes:
-            cube.data = np.float64(cube.data)
-    elif data_type == 'int32':
-        for cube in cubes:
-            cube.data = np.int32(cube.data)
-    elif data_type == 'int64':
-        for cube in cubes:
-            cube.data = np.int64(cube.data)
-    else:
+    try:
+        if data_type == 'common':
+            dtype = np.result_type(*[cube.dtype for cube in cubes])
+        else:
+            dtype = np.dtype(data_type)
+    except TypeError:
         logger.error("invalid data type")
+        raise ValueError("invalid data type {}".format(data_type))
+    for cube in cubes:
+        if cube.dtype == dtype:
+            continue
+        if not np.can_cast(cube.dtype, dtype, casting):
+            raise ValueError("Cannot cast {} to {} under the {} casting "
+                             "rule".format(cube.dtype, dtype, casting))
+        if in_place and not cube.has_lazy_data():
+            cube.data = _cast_in_place(cube.data, dtype)
+        else:
+            cube.data = cube.core_data().astype(dtype)
+    return cubes
 
 
-def equalise_dim_coords(cubes, comp_only=False):
+def _coord_values_differ(coords):
     """
-    Equalises dimensional coordinates of Cubes, specifically long_name,
-    standard_name, and var_name.
+    Checks whether the points and bounds of coords differ, comparing
+    every coord against the first in a single vectorised step.
 
     Args:
-        cubes: CubeList or list of Cubes to equalise.
+        coords: a list of coords of the same name.
 
-        comp_only: A boolean value, if set to True it will examine
-        the cubes dimension coordinates and print inconsistencies
-        but not equalise them.
+    Returns:
+        points_differ, bounds_differ: booleans.
+    """
+    if len({coord.shape for coord in coords}) > 1:
+        return True, True
+    points = np.stack([coord.points for coord in coords])
+    points_differ = not (points == points[0]).all()
+    has_bounds = [coord.has_bounds() for coord in coords]
+    if not any(has_bounds):
+        bounds_differ = False
+    elif not all(has_bounds) or \
+            len({coord.bounds.shape for coord in coords}) > 1:
+        bounds_differ = True
+    else:
+        bounds = np.stack([coord.bounds for coord in coords])
+        bounds_differ = not (bounds == bounds[0]).all()
+    return points_differ, bounds_differ
+
+
+def _dim_coord_index(cube):
+    return {coord.name(): coord for coord in cube.dim_coords}
+
+
+def _dim_coord_changes(coord_indexes, comp_only=False):
+    """
+    Works out the metadata each dim coord is to be given, from the last
+    cube having it, and when comparing which coords are inconsistent.
+
+    Args:
+        coord_indexes: a name to coord dict of the dim coords of each
+        cube.
+
+        comp_only (optional): if True, also find the inconsistencies,
+        including in the points and bounds of dim coords other than time.
 
     Returns:
-        Cubes equalised across dimension coordinates.
+        coord_dict, inconsistencies: the metadata of each coord by name,
+        and a list of (component, set of coord names) pairs.
     """
-    logger = log_module()
     inconsistency_sn = set()
     inconsistency_ln = set()
     inconsistency_vn = set()
     inconsistency_attr = set()
+    inconsistency_points = set()
+    inconsistency_bounds = set()
     coord_dict = {}
-    for cube in cubes:
-        for coord in cube.dim_coords:
-            coord_dict.update(
-                {coord.name(): {'long_name': coord.long_name,
+    for coord_index in coord_indexes:
+        for name, coord in coord_index.items():
+            coord_dict[name] = {'long_name': coord.long_name,
                                 'standard_name': coord.standard_name,
                                 'var_name': coord.var_name,
-                                'attributes': coord.attributes}})
+                                'attributes': coord.attributes}
+    if comp_only:
+        for name, metadata in coord_dict.items():
+            coords = [coord_index[name] for coord_index in coord_indexes
+                      if name in coord_index]
+            attributes = _attributes_key(metadata['attributes'])
+            for coord in coords:
+                if coord.standard_name != metadata['standard_name']:
+                    inconsistency_sn.add(name)
+                if coord.long_name != metadata['long_name']:
+                    inconsistency_ln.add(name)
+                if coord.var_name != metadata['var_name']:
+                    inconsistency_vn.add(name)
+                if _attributes_key(coord.attributes) != attributes:
+                    inconsistency_attr.add(name)
+            if not coords[0].units.is_time_reference():
+                points_differ, bounds_differ = _coord_values_differ(coords)
+                if points_differ:
+                    inconsistency_points.add(name)
+                if bounds_differ:
+                    inconsistency_bounds.add(name)
+    inconsistencies = [('coords standard_name', inconsistency_sn),
+                       ('coords long_name', inconsistency_ln),
+                       ('coords var_name', inconsistency_vn),
+                       ('coords attributes', inconsistency_attr),
+                       ('coords points', inconsistency_points),
+                       ('coords bounds', inconsistency_bounds)]
+    return coord_dict, inconsistencies
 
-    for coord in coord_dict:
-        for cube in cubes:
-            if comp_only:
-                if cube.coord(coord).standard_name != \
-                        coord_dict[coord]['standard_name']:
-                    inconsistency_sn.add(coord)
-                if cube.coord(coord).long_name != \
-                        coord_dict[coord]['long_name']:
-                    inconsistency_ln.add(coord)
-                if cube.coord(coord).var_name != \
-                        coord_dict[coord]['var_name']:
-                    inconsistency_vn.add(coord)
-                if cube.coord(coord).attributes != \
-                        coord_dict[coord]['attributes']:
-                    inconsistency_attr.add(coord)
-            else:
-                try:
-                    cube.coord(coord).standard_name = \
-                        coord_dict[coord]['standard_name']
-                    cube.coord(coord).long_name = \
-                        coord_dict[coord]['long_name']
-                    cube.coord(coord).var_name = \
-                        coord_dict[coord]['var_name']
-                    cube.coord(coord).attributes = \
-                        coord_dict[coord]['attributes']
-                except ValueError:
-                    pass
-    if any([inconsistency_sn,
-            inconsistency_ln,
-            inconsistency_vn,
-            inconsistency_attr]):
+
+def _log_dim_coord_inconsistencies(inconsistencies):
+    logger = log_module()
+    if any(names for _, names in inconsistencies):
         logger.info("\ncube dim coordinates differ: \n")
+    for component, names in inconsistencies:
+        log_inconsistent(list(names), component)
+
+
+def _apply_dim_coord_changes(coord_indexes, coord_dict):
+    for coord_index in coord_indexes:
+        for name, coord in coord_index.items():
+            metadata = coord_dict[name]
+            try:
+                coord.standard_name = metadata['standard_name']
+                coord.long_name = metadata['long_name']
+                coord.var_name = metadata['var_name']
+                coord.attributes = dict(metadata['attributes'])
+            except ValueError:
+                pass
+
+
+def equalise_dim_coords(cubes, comp_only=False):
+    """
+    Equalises dimensional coordinates of Cubes, specifically long_name,
+    standard_name, and var_name.
+
+    Args:
+        cubes: CubeList or list of Cubes to equalise.
+
+        comp_only: A boolean value, if set to True it will examine
+        the cubes dimension coordinates and print inconsistencies
+        but not equalise them. The points and bounds of dimension
+        coordinates other than time are examined too.
+
+    Returns:
+        Cubes equalised across dimension coordinates.
+    """
+    coord_indexes = [_dim_coord_index(cube) for cube in cubes]
+    coord_dict, inconsistencies = _dim_coord_changes(coord_indexes,
+                                                     comp_only)
     if comp_only:
-        log_inconsistent(list(inconsistency_sn), 'coords standard_name')
-        log_inconsistent(list(inconsistency_ln), 'coords long_name')
-        log_inconsistent(list(inconsistency_vn), 'coords var_name')
-        log_inconsistent(list(inconsistency_attr), 'coords attributes')
+        _log_dim_coord_inconsistencies(inconsistencies)
+    else:
+        _apply_dim_coord_changes(coord_indexes, coord_dict)
     return cubes
 
 
+def _aux_coord_index(cube):
+    return {coord.name(): coord for coord in cube.aux_coords}
+
+
+def _uncommon_names(coord_indexes):
+    """
+    Finds the names of the coords which are not common to all cubes,
+    given a name to coord dict of each cube.
+    """
+    if not coord_indexes:
+        return set()
+    common_coords = set(coord_indexes[0]).intersection(*coord_indexes[1:])
+    return set().union(*coord_indexes) - common_coords
+
+
+def _backfill_height(cubes, coord_indexes, uncommon_coords):
+    """
+    Adds a copy of the first cube's height coord to the cubes without
+    one.
+    """
+    logger = log_module()
+    if 'height' not in uncommon_coords:
+        return
+    donor = next(index['height'] for index in coord_indexes
+                 if 'height' in index)
+    for cube, index in zip(cubes, coord_indexes):
+        if 'height' not in index:
+            cube.add_aux_coord(donor.copy())
+    logger.info("Adding {} coords to cube\n".format('height'))
+
+
 def equalise_aux_coords(cubes, comp_only=False):
     """
     Equalises auxillary coordinates of cubes.
@@ -216,39 +533,12 @@ def equalise_aux_coords(cubes, comp_only=False):
     Returns:
         Cubes equalised across auxillary coordinates.
     """
-    logger = log_module()
-    inconsistencies = set({})
-    change_messages = set({})
-    cube_combs = list(combinations(cubes, 2))
-    for combs in cube_combs:
-        cube_a_dict = {c.name(): c for c in combs[0].aux_coords}
-        cube_b_dict = {c.name(): c for c in combs[1].aux_coords}
-        cube_a_coords = {c for c in cube_a_dict}
-        cube_b_coords = {c for c in cube_b_dict}
-        for coord in list(cube_a_coords):
-            if coord not in cube_b_coords:
-                if comp_only:
-                    inconsistencies.add(coord)
-                elif coord == 'height':
-                    change_messages.add("Adding {} coords to cube\n".
-                                        format(coord))
-                    combs[1].add_aux_coord(cube_a_dict[coord])
-        for coord in list(cube_b_coords):
-            if coord not in cube_a_coords:
-                if comp_only:
-                    inconsistencies.add(coord)
-                elif coord == 'height':
-                    change_messages.add("Adding {} coords to cube\n".
-                                        format(coord))
-                    combs[0].add_aux_coord(cube_b_dict[coord])
-    if inconsistencies:
-        inconsistencies = list(inconsistencies)
-        log_inconsistent(inconsistencies, 'coords')
-
-    if change_messages:
-        for message in change_messages:
-            logger.info(message)
-
+    coord_indexes = [_aux_coord_index(cube) for cube in cubes]
+    uncommon_coords = _uncommon_names(coord_indexes)
+    if comp_only:
+        log_inconsistent(list(uncommon_coords), 'coords')
+    else:
+        _backfill_height(cubes, coord_indexes, uncommon_coords)
     return cubes
 
 
@@ -268,11 +558,243 @@ def remove_attributes(cubes):
             cube.attributes[attr] = ''
 
 
+def _units_to_list(units):
+    return [str(units), units.calendar]
+
+
+def _coord_to_dict(coord):
+    return {'standard_name': coord.standard_name,
+            'long_name': coord.long_name,
+            'var_name': coord.var_name,
+            'units': _units_to_list(coord.units),
+            'points': _encode_value(coord.points),
+            'bounds': _encode_value(coord.bounds),
+            'attributes': {key: _encode_value(value)
+                           for key, value in coord.attributes.items()}}
+
+
+def _coord_from_dict(coord):
+    return AuxCoord(_decode_value(coord['points']),
+                    standard_name=coord['standard_name'],
+                    long_name=coord['long_name'],
+                    var_name=coord['var_name'],
+                    units=cf_units.Unit(*coord['units']),
+                    bounds=_decode_value(coord['bounds']),
+                    attributes={key: _decode_value(value)
+                                for key, value in
+                                coord['attributes'].items()})
+
+
+class EqualisationPlan(object):
+    """
+    The changes equalising a set of cubes makes, worked out from their
+    metadata without changing them. A plan can be saved, loaded and
+    applied to any cubes, e.g. to the files of another experiment of the
+    same model and variable, without comparing those cubes again.
+
+    Args:
+        height (optional): the height coord to add to cubes without one.
+
+        attributes (optional): the keys of the attributes to remove.
+
+        dim_coords (optional): a dict of the standard_name, long_name,
+        var_name and attributes to give each dim coord, by coord name.
+
+        time_origin (optional): the time origin of the reference cube,
+        logged when time coords with another origin are converted.
+
+        time_epochs (optional): a dict of the units to convert time
+        coords of each calendar to, by calendar.
+    """
+
+    def __init__(self, height=None, attributes=None, dim_coords=None,
+                 time_origin=None, time_epochs=None):
+        self.height = height
+        self.attributes = list(attributes or [])
+        self.dim_coords = dict(dim_coords or {})
+        self.time_origin = time_origin
+        self.time_epochs = dict(time_epochs or {})
+
+    def __eq__(self, other):
+        if not isinstance(other, EqualisationPlan):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def apply(self, cubes, lazy=False):
+        """
+        Equalises cubes according to the plan in a single pass over the
+        cubes.
+
+        Args:
+            cubes: CubeList or list of Cubes to equalise.
+
+            lazy (optional): if True the conversion of auxiliary time
+            coordinates is deferred until their points are needed.
+
+        Returns:
+            cubes: Cubes equalised across metadata and coords.
+        """
+        logger = log_module()
+        messages = set()
+        height_added = False
+        time_coords = []
+        for cube in cubes:
+            if self.height is not None and not cube.coords('height'):
+                cube.add_aux_coord(self.height.copy())
+                height_added = True
+            for key in self.attributes:
+                cube.attributes.pop(key, None)
+            for coord in cube.dim_coords:
+                metadata = self.dim_coords.get(coord.name())
+                if metadata is None:
+                    continue
+                try:
+                    coord.standard_name = metadata['standard_name']
+                    coord.long_name = metadata['long_name']
+                    coord.var_name = metadata['var_name']
+                    coord.attributes = dict(metadata['attributes'])
+                except ValueError:
+                    pass
+            time_coords.append(_time_coords(cube))
+            for time_coord in time_coords[-1]:
+                if time_coord.units.origin != self.time_origin:
+                    messages.add("New time origin set to "
+                                 "{}\n".format(self.time_origin))
+        for time_coord, epoch in _time_conversions(time_coords,
+                                                   dict(self.time_epochs)):
+            _convert_time_coord(time_coord, epoch, lazy)
+        if height_added:
+            logger.info("Adding {} coords to cube\n".format('height'))
+        log_coord_remove(list(self.attributes), 'attributes')
+        _log_messages(messages)
+        return cubes
+
+    def to_dict(self):
+        """
+        Converts the plan into a JSON serialisable dict.
+        """
+        height = None
+        if self.height is not None:
+            height = _coord_to_dict(self.height)
+        dim_coords = {}
+        for name, metadata in self.dim_coords.items():
+            dim_coords[name] = dict(metadata)
+            dim_coords[name]['attributes'] = {
+                key: _encode_value(value)
+                for key, value in metadata['attributes'].items()}
+        return {'version': _PLAN_VERSION,
+                'height': height,
+                'attributes': list(self.attributes),
+                'dim_coords': dim_coords,
+                'time_origin': self.time_origin,
+                'time_epochs': {calendar: _units_to_list(units)
+                                for calendar, units in
+                                self.time_epochs.items()}}
+
+    @classmethod
+    def from_dict(cls, plan):
+        """
+        Converts a dict written by to_dict back into a plan.
+        """
+        if plan.get('version') != _PLAN_VERSION:
+            raise ValueError("Unsupported equalisation plan version "
+                             "{}".format(plan.get('version')))
+        height = None
+        if plan['height'] is not None:
+            height = _coord_from_dict(plan['height'])
+        dim_coords = {}
+        for name, metadata in plan['dim_coords'].items():
+            dim_coords[name] = dict(metadata)
+            dim_coords[name]['attributes'] = {
+                key: _decode_value(value)
+                for key, value in metadata['attributes'].items()}
+        return cls(height=height,
+                   attributes=plan['attributes'],
+                   dim_coords=dim_coords,
+                   time_origin=plan['time_origin'],
+                   time_epochs={calendar: cf_units.Unit(*units)
+                                for calendar, units in
+                                plan['time_epochs'].items()})
+
+    def save(self, filename):
+        """
+        Writes the plan to a JSON file, replacing it atomically.
+
+        Args:
+            filename: the file to write the plan to.
+        """
+        directory = os.path.dirname(os.path.abspath(filename))
+        handle, tmp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as plan_file:
+            json.dump(self.to_dict(), plan_file)
+        _replace_file(tmp_name, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Reads a plan written by save.
+
+        Args:
+            filename: the file to read the plan from.
+
+        Returns:
+            an EqualisationPlan.
+        """
+        with open(filename) as plan_file:
+            return cls.from_dict(json.load(plan_file))
+
+
+def _make_plan(cubes, aux_indexes, attribute_items, dim_indexes,
+               time_coords):
+    height = None
+    if 'height' in _uncommon_names(aux_indexes):
+        height = next(index['height'] for index in aux_indexes
+                      if 'height' in index).copy()
+    coord_dict, _ = _dim_coord_changes(dim_indexes)
+    for metadata in coord_dict.values():
+        metadata['attributes'] = dict(metadata['attributes'])
+    epochs = {}
+    for coords in time_coords:
+        for time_coord in coords:
+            epochs.setdefault(time_coord.units.calendar, time_coord.units)
+    return EqualisationPlan(
+        height=height,
+        attributes=_uncommon_attribute_keys(attribute_items),
+        dim_coords=coord_dict,
+        time_origin=cubes[0].coord('time').units.origin,
+        time_epochs=epochs)
+
+
+def plan_equalisation(cubes):
+    """
+    Works out the changes equalise_all would make to cubes, without
+    changing them.
+
+    Args:
+        cubes: CubeList or list of Cubes to plan the equalisation of.
+
+    Returns:
+        an EqualisationPlan which equalises cubes when applied to them.
+    """
+    return _make_plan(cubes,
+                      [_aux_coord_index(cube) for cube in cubes],
+                      [_attribute_items(cube) for cube in cubes],
+                      [_dim_coord_index(cube) for cube in cubes],
+                      [_time_coords(cube) for cube in cubes])
+
+
 def equalise_all(cubes):
     """
     Invokes equalise_aux_coords, equalise_attributes,
     equalise_dim_coords and equalise_time units all at once.
-    Used before cube_load concatenates the cubes.
+    Used before cube_load concatenates the cubes. The cubes are
+    equalised by working out and applying an EqualisationPlan.
 
     Args:
         cubes: Cubes to be equalised.
@@ -282,106 +804,416 @@ def equalise_all(cubes):
 
 
     """
-    cubes = equalise_aux_coords(cubes)
-    cubes = equalise_attributes(cubes)
-    cubes = equalise_dim_coords(cubes)
-    cubes = equalise_time_units(cubes)
-    return cubes
+    return plan_equalisation(cubes).apply(cubes)
+
+
+def _array_digest(array):
+    array = np.asarray(array)
+    if array.dtype.kind == 'O':
+        return array.dtype.str, repr(array.tolist())
+    return array.dtype.str, hashlib.sha1(array.tobytes()).hexdigest()
+
+
+def _coord_signature(cube, coord, time_dims):
+    """
+    Reduces a coord to hashable metadata. The length and values of a
+    coord spanning the time dimension are left out, as they are expected
+    to differ between the files of a dataset.
+    """
+    dims = cube.coord_dims(coord)
+    if any(dim in time_dims for dim in dims):
+        shape = tuple(None if dim in time_dims else length
+                      for dim, length in zip(dims, coord.shape))
+        points = None
+    else:
+        shape = coord.shape
+        points = _array_digest(coord.points)
+    return (coord.name(), coord.standard_name, coord.long_name,
+            coord.var_name, str(coord.units), shape, points,
+            _attributes_key(coord.attributes))
+
+
+def _cube_signature(cube):
+    """
+    Reduces a cube to a hashable signature of the metadata compare_cubes
+    examines, so that cubes with equal signatures need not be compared.
+
+    Args:
+        cube: the Cube to summarise.
+
+    Returns:
+        a namedtuple of the cube's ndim, aux coords, dim coords,
+        attributes and time units.
+    """
+    time_units = None
+    time_dims = ()
+    if cube.coords('time'):
+        time_coord = cube.coord('time')
+        time_units = (time_coord.units.origin, time_coord.units.calendar)
+        time_dims = cube.coord_dims(time_coord)
+    return _Signature(
+        ndim=cube.ndim,
+        aux_coords=tuple(sorted(_coord_signature(cube, coord, time_dims)
+                                for coord in cube.aux_coords)),
+        dim_coords=tuple(_coord_signature(cube, coord, time_dims)
+                         for coord in cube.dim_coords),
+        attributes=_attributes_key(cube.attributes),
+        time_units=time_units)
+
+
+def _fingerprint(cube):
+    """
+    Reduces a cube to its signature and the names and units of its time
+    reference coords.
+    """
+    return _cube_signature(cube), tuple(
+        (coord.name(), coord.units.origin, coord.units.calendar)
+        for coord in _time_coords(cube))
+
+
+def _consistent(cubes):
+    """
+    Checks cheaply whether cubes already have matching metadata, in which
+    case comparing and equalising them would change nothing. Each cube
+    is fingerprinted once, stopping at the first which differs from the
+    first cube.
+
+    Args:
+        cubes: CubeList or list of Cubes to check.
+
+    Returns:
+        True if the cubes need no equalising, otherwise False.
+    """
+    if not cubes or not cubes[0].coords('time'):
+        return False
+    fingerprint = _fingerprint(cubes[0])
+    if any(_fingerprint(cube) != fingerprint for cube in cubes[1:]):
+        return False
+    # Equalising also converts any time coords of a cube which are not
+    # in the units of the cube's first time coord of their calendar.
+    origin = cubes[0].coord('time').units.origin
+    epochs = {}
+    for time_coord in _time_coords(cubes[0]):
+        epoch = epochs.setdefault(time_coord.units.calendar,
+                                  time_coord.units)
+        if time_coord.units.origin != origin or time_coord.units != epoch:
+            return False
+    return True
+
+
+def _survey(cubes):
+    """
+    Gathers all the metadata the comparison and equalisation of cubes
+    need in a single pass over the cubes.
+
+    Args:
+        cubes: the Cubes to survey.
+
+    Returns:
+        a Survey namedtuple of a list of each of the signatures, aux
+        coord indexes, dim coord indexes, attribute items and time
+        reference coords of the cubes, and the groups of cubes with
+        matching signatures other than their attributes as lists of
+        indices.
+    """
+    signatures = []
+    aux_indexes = []
+    dim_indexes = []
+    attribute_items = []
+    time_coords = []
+    groups = OrderedDict()
+    for index, cube in enumerate(cubes):
+        signature = _cube_signature(cube)
+        signatures.append(signature)
+        # Attributes such as tracking_id differ file by file, so are
+        # compared across all the cubes rather than grouped by.
+        groups.setdefault(signature._replace(attributes=None),
+                          []).append(index)
+        aux_indexes.append(_aux_coord_index(cube))
+        dim_indexes.append(_dim_coord_index(cube))
+        attribute_items.append(_attribute_items(cube))
+        time_coords.append(_time_coords(cube))
+    return _Survey(signatures=signatures,
+                   aux_indexes=aux_indexes,
+                   dim_indexes=dim_indexes,
+                   attribute_items=attribute_items,
+                   time_coords=time_coords,
+                   groups=list(groups.values()))
+
+
+def _differs(survey, component):
+    if component == 'attributes':
+        return bool(_uncommon_attribute_keys(survey.attribute_items))
+    return len({getattr(survey.signatures[group[0]], component)
+                for group in survey.groups}) > 1
 
 
-def compare_cubes(cubes):
+def _report_groups(survey, cube_files=None):
+    """
+    Logs the groups of matching cubes, raising an OSError if the cubes
+    differ in their number of dimensions.
+    """
+    logger = log_module()
+    if _differs(survey, 'ndim'):
+        logger.error("Number of dimensions for cubes differ,"
+                     " please load cubes of matching ndim")
+        raise OSError
+    if cube_files is None:
+        labels = ['cube {}'.format(index)
+                  for index in range(len(survey.signatures))]
+    else:
+        labels = list(cube_files)
+    msg = "\ncubes fall into {} groups of matching metadata:\n".format(
+        len(survey.groups))
+    for number, group in enumerate(survey.groups):
+        msg = msg + "\tgroup {}: {}\n".format(
+            number + 1, ', '.join(labels[index] for index in group))
+    logger.info(msg)
+
+
+def compare_cubes(cubes, cube_files=None):
     """
     Examines coordinates and attributes across iterable of iris cubes
     And calls equalise functions (with comp_only arg set to true) where
-    appropriate.
+    appropriate. Each cube is reduced once to a signature of its
+    metadata and the cubes grouped by signature, so only one cube from
+    each group need be compared. Attributes, which often differ file by
+    file, are left out of the grouping and compared across all cubes.
 
     Args:
         cubes: An iterable of iris Cubes or CubeList to be compared
         for inconsostencies.
 
+        cube_files (optional): the respective files of cubes, to name
+        the files in each group of matching cubes.
+
     Returns:
-        A printed string detailing the inconsistencies in the cubes.
+        A printed string detailing the inconsistencies in the cubes, and
+        a list of the groups of matching cubes as lists of indices into
+        cubes.
     """
     logger = log_module()
-    uneq_aux_coords = False
-    uneq_dim_coords = False
-    uneq_attr = False
-    uneq_time_coords = False
-    uneq_ndim = False
-    cube_combs = list(combinations(cubes, 2))
-    for comb in cube_combs:
-        if (uneq_aux_coords and
-                uneq_attr and
-                uneq_dim_coords and
-                uneq_time_coords and
-                uneq_ndim):
-            break
-
-        if comb[0].aux_coords != comb[1].aux_coords:
-            uneq_aux_coords = True
-
-        if comb[0].dim_coords != comb[1].dim_coords:
-            uneq_dim_coords = True
-
-        if comb[0].attributes != comb[1].attributes:
-            uneq_attr = True
-
-        if comb[0].ndim != comb[1].ndim:
-            uneq_ndim = True
-            break
-
-        if comb[0].coord('time').units != comb[1].coord('time').units:
-            uneq_time_coords = True
-            break
-
-    if uneq_ndim:
-        logger.error("Number of dimensions for cubes differ,"
-                     " please load cubes of matching ndim")
-        raise OSError
+    survey = _survey(cubes)
+    attributes_differ = _differs(survey, 'attributes')
+    if len(survey.groups) < 2 and not attributes_differ:
+        return survey.groups
+    if len(survey.groups) > 1:
+        _report_groups(survey, cube_files)
+    representatives = [cubes[group[0]] for group in survey.groups]
 
-    if uneq_aux_coords:
+    if _differs(survey, 'aux_coords'):
         logger.info("\ncube aux coordinates differ: \n")
-        equalise_aux_coords(cubes, comp_only=True)
+        equalise_aux_coords(representatives, comp_only=True)
 
-    if uneq_dim_coords:
-        equalise_dim_coords(cubes, comp_only=True)
+    if _differs(survey, 'dim_coords'):
+        equalise_dim_coords(representatives, comp_only=True)
 
-    if uneq_attr:
+    if attributes_differ:
         logger.info("cube attributes differ: \n")
         equalise_attributes(cubes, comp_only=True)
 
-    if uneq_time_coords:
+    if _differs(survey, 'time_units'):
         logger.info("cube time coordinates differ: \n")
-        equalise_time_units(cubes, comp_only=True)
+        equalise_time_units(representatives, comp_only=True)
+    return survey.groups
+
+
+def _compare_and_plan(cubes, cube_files=None):
+    """
+    Logs the comparison of cubes and works out the plan equalising them,
+    from a single survey of their metadata.
+    """
+    logger = log_module()
+    survey = _survey(cubes)
+    compare = len(survey.groups) > 1 or _differs(survey, 'attributes')
+    if len(survey.groups) > 1:
+        _report_groups(survey, cube_files)
+    plan = _make_plan(cubes, survey.aux_indexes, survey.attribute_items,
+                      survey.dim_indexes, survey.time_coords)
+
+    if compare:
+        if _differs(survey, 'aux_coords'):
+            logger.info("\ncube aux coordinates differ: \n")
+            log_inconsistent(list(_uncommon_names(survey.aux_indexes)),
+                             'coords')
+        if _differs(survey, 'dim_coords'):
+            # Cubes with matching signatures have matching dim coords, so
+            # only one cube of each group need be compared.
+            _, dim_inconsistencies = _dim_coord_changes(
+                [survey.dim_indexes[group[0]] for group in survey.groups],
+                comp_only=True)
+            _log_dim_coord_inconsistencies(dim_inconsistencies)
+        if _differs(survey, 'attributes'):
+            logger.info("cube attributes differ: \n")
+            log_inconsistent(list(plan.attributes), 'attibutes')
+        if _differs(survey, 'time_units'):
+            logger.info("cube time coordinates differ: \n")
+            time_units = cubes[0].coord('time').units
+            comp_messages, _, _ = _time_unit_changes(
+                survey.time_coords, time_units.origin, time_units.calendar)
+            _log_messages(comp_messages)
+    return plan
+
+
+def compare_and_equalise(cubes, cube_files=None):
+    """
+    Compares and then equalises cubes, with the same logged report and
+    the same resulting cubes as compare_cubes followed by equalise_all.
+    The metadata of the cubes is gathered in a single pass, and each
+    comparison is worked out once and used both to report and to
+    equalise the cubes.
+
+    Args:
+        cubes: An iterable of iris Cubes or CubeList to be compared
+        and equalised.
+
+        cube_files (optional): the respective files of cubes, to name
+        the files in each group of matching cubes.
+
+    Returns:
+        cubes: Cubes equalised across metadata and coords.
+    """
+    return _compare_and_plan(cubes, cube_files).apply(cubes)
+
+
+def _time_extents(cubes):
+    """
+    Reads the earliest and latest time of each cube in the units of the
+    first, from the time bounds if every cube has them and from the
+    points otherwise.
+
+    Args:
+        cubes: Cubes with one dimensional time coordinates.
+
+    Returns:
+        starts, ends, use_bounds, step: arrays of the earliest and
+        latest times, whether they were read from bounds, and when read
+        from points the typical spacing between points.
+    """
+    coords = [cube.coord('time') for cube in cubes]
+    use_bounds = all(coord.has_bounds() for coord in coords)
+    ref_units = coords[0].units
+    starts = np.empty(len(coords))
+    ends = np.empty(len(coords))
+    steps = []
+    for index, coord in enumerate(coords):
+        values = coord.bounds if use_bounds else coord.points
+        if coord.units != ref_units and \
+                coord.units.is_convertible(ref_units):
+            values = coord.units.convert(values, ref_units)
+        starts[index] = values.min()
+        ends[index] = values.max()
+        if not use_bounds and values.size > 1:
+            steps.append(np.diff(np.sort(values)))
+    step = None
+    if not use_bounds:
+        if steps:
+            step = np.median(np.concatenate(steps))
+        elif len(coords) > 1:
+            step = np.median(np.diff(np.sort(starts)))
+    return starts, ends, use_bounds, step
+
+
+def examine_time_extents(cubes, cube_files=None):
+    """
+    Finds every overlap, gap and duplicate between the time extents of
+    cubes, by sorting the extents once and sweeping through them. Uses
+    the time bounds where every cube has them. Otherwise the points are
+    used, where cubes overlap if they share a time and there is a gap
+    if the step between them is over one and a half times the typical
+    step between points.
+
+    Args:
+        cubes: Iris cubes to examine the time extents of.
+
+        cube_files (optional): the respective files of cubes.
+
+    Returns:
+        a TimeExtentReport namedtuple. overlaps and gaps are lists of
+        (index_a, index_b) pairs of cubes, in time order, and duplicates
+        a list of tuples of the indices of cubes with identical time
+        extents. cube_files gives the file of each index.
+    """
+    if cube_files is None:
+        cube_files = ['cube {}'.format(index) for index in range(len(cubes))]
+    report = TimeExtentReport(overlaps=[], gaps=[], duplicates=[],
+                              cube_files=list(cube_files))
+    if len(cubes) < 2 or not all(cube.coords('time') for cube in cubes):
+        return report
+    starts, ends, use_bounds, step = _time_extents(cubes)
+    order = np.lexsort((ends, starts))
+    starts = starts[order]
+    ends = ends[order]
+    same = (starts[1:] == starts[:-1]) & (ends[1:] == ends[:-1])
+    edges = np.diff(np.concatenate(([0], same.astype(int), [0])))
+    duplicate_run = np.arange(len(order))
+    for first, last in zip(np.flatnonzero(edges == 1),
+                           np.flatnonzero(edges == -1)):
+        duplicate_run[first:last + 1] = first
+        report.duplicates.append(tuple(order[first:last + 1].tolist()))
+    # Later cubes overlap a cube if they start before it ends, or when
+    # comparing points, at the time it ends.
+    limits = np.searchsorted(starts, ends,
+                             side='left' if use_bounds else 'right')
+    for first in np.flatnonzero(limits > np.arange(len(order)) + 1):
+        for second in range(first + 1, limits[first]):
+            if duplicate_run[first] != duplicate_run[second]:
+                report.overlaps.append((int(order[first]),
+                                        int(order[second])))
+    latest_ends = np.maximum.accumulate(ends)[:-1]
+    if use_bounds:
+        gaps = starts[1:] > latest_ends
+    else:
+        gaps = starts[1:] - latest_ends > 1.5 * step
+    for first in np.flatnonzero(gaps):
+        report.gaps.append((int(order[first]), int(order[first + 1])))
+    return report
+
+
+def _joins_along_time(cubes):
+    """
+    Whether cubes can only be concatenated along time, i.e. every
+    dimension other than time has the same length and dim coord in each
+    of them. Cubes split along another dimension, e.g. spatial tiles,
+    share their time extents without overlapping.
+    """
+    keys = []
+    for cube in cubes:
+        if not cube.coords('time', dim_coords=True):
+            return False
+        time_dim = cube.coord_dims('time')[0]
+        keys.append(([length for dim, length in enumerate(cube.shape)
+                      if dim != time_dim],
+                     [coord for coord in cube.dim_coords
+                      if cube.coord_dims(coord)[0] != time_dim]))
+    return all(key == keys[0] for key in keys[1:])
 
 
 def _examine_dim_bounds(cubes, cube_files):
-    Range = namedtuple('Range', ['start', 'end'])
+    report = examine_time_extents(cubes, cube_files)
     msg = ''
-    for i, cube_a in enumerate(cubes):
-        for j, cube_b in enumerate(cubes):
-            if i != j:
-                range_a = Range(start=cube_a.coord('time').bounds[0][0],
-                                end=cube_a.coord('time').bounds[-1][-1])
-                range_b = Range(start=cube_b.coord('time').bounds[0][0],
-                                end=cube_b.coord('time').bounds[-1][-1])
-                latest_start = max(range_a.start, range_b.start)
-                earliest_end = min(range_a.end, range_b.end)
-                delta = earliest_end - latest_start
-                overlap = max(0, delta)
-                if overlap > 0:
-                    msg = msg + "\nThe time coordinates overlap at cube {}" \
-                                " and cube {}".format(i, j)
-                    msg = msg + "\nThese cubes are: \n\t{}\n\t{}"\
-                        .format(cube_files[i], cube_files[j])
-                    break
+    for i, j in report.overlaps:
+        msg = msg + "\nThe time coordinates overlap at cube {}" \
+                    " and cube {}".format(i, j)
+        msg = msg + "\nThese cubes are: \n\t{}\n\t{}"\
+            .format(cube_files[i], cube_files[j])
+    for duplicate in report.duplicates:
+        msg = msg + "\nThe time coordinates are identical at cubes " \
+                    "{}".format(', '.join(str(i) for i in duplicate))
+        msg = msg + "\nThese cubes are: \n\t{}".format(
+            '\n\t'.join(cube_files[i] for i in duplicate))
+    for i, j in report.gaps:
+        msg = msg + "\nThere is a gap in the time coordinates between " \
+                    "cube {} and cube {}".format(i, j)
+        msg = msg + "\nThese cubes are: \n\t{}\n\t{}"\
+            .format(cube_files[i], cube_files[j])
     return msg
 
 
 def examine_dim_bounds(cubes, cube_files):
     """
     Examines the dimensional bounds of time should concatenate fail.
-    Cycles through cubes and determines if the times are contiguous.
+    Reports every overlap, duplicate and gap in the times of the cubes.
 
     Args:
          cubes: Iris cubes to examine the time bounds of
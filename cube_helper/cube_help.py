@@ -5,213 +5,218 @@
 # BSD 3-Clause license.
 # See LICENSE in the root of the repository for full licensing details.
 from __future__ import (absolute_import, division, print_function)
+import os
 import iris
-import iris.coord_categorisation
 from six import string_types
 from cube_helper.logger import log_module, muffle_logger, reset_logger
 from cube_helper.cube_loader import (load_from_filelist,
                                      load_from_dir,
+                                     _rechunk,
                                      _constraint_compatible,
                                      _fix_partial_datetime)
-from cube_helper.cube_equaliser import (compare_cubes,
+from cube_helper.cube_aggregator import (grouped_aggregated_by,
+                                         streamed_aggregated_by,
+                                         streamable)
+from cube_helper.cube_categorical import (add_categorised,
+                                          time_fingerprint)
+from cube_helper.cube_equaliser import (compare_and_equalise,
+                                        EqualisationPlan,
+                                        _compare_and_plan,
+                                        _consistent,
                                         equalise_all,
-                                        _examine_dim_bounds)
+                                        examine_time_extents,
+                                        _examine_dim_bounds,
+                                        _joins_along_time)
 
 
-def load(directory, filetype='.nc', constraints=None):
+def _check_lazy(cubes, stage):
     """
-    A function that loads and concatenates Iris Cubes.
+    Raises a RuntimeError if the data of any of the cubes has been
+    realised.
 
     Args:
-        directory: A String specifying the directory or filename of the Cubes
-        you wish to concatenate. Accepts either directory location or a list
-        or glob object of individual Cubes.
+        cubes: a Cube or an iterable of Cubes to check.
 
-        filetype: Extension of Iris Cubes to Load. set to '.nc' by default.
-        constraints: Any constraints to be applied to Cubes on load.
-
-    Returns:
-        result: A concatenated Iris Cube.
+        stage: a description of the step just run, for the error message.
     """
-    logger = log_module()
-    if isinstance(directory, string_types):
-        loaded_cubes, cube_files = load_from_dir(
-            directory, filetype, constraints)
-        if not loaded_cubes:
-            raise OSError("No cubes loaded")
-        else:
-            compare_cubes(loaded_cubes)
-            result = equalise_all(loaded_cubes)
-            result = iris.cube.CubeList(result)
-            try:
-                result = result.concatenate_cube()
-                return result
-            except iris.exceptions.ConcatenateError:
-                logger.info("\nThere was an error in concatenation\n")
-                err_msg = _examine_dim_bounds(result, cube_files)
-                logger.error(err_msg)
-                raise
+    if isinstance(cubes, iris.cube.Cube):
+        cubes = [cubes]
+    realised = [index for index, cube in enumerate(cubes)
+                if not cube.has_lazy_data()]
+    if realised:
+        raise RuntimeError("Data of cube(s) {} was realised during "
+                           "{}".format(realised, stage))
 
-    elif isinstance(directory, list):
-        loaded_cubes, cube_files = load_from_filelist(
-            directory, filetype, constraints)
 
-        if not loaded_cubes:
-            raise OSError("No cubes loaded")
+def _equalise_loaded(loaded_cubes, cube_files, plan=None):
+    """
+    Equalises loaded cubes, by comparing them or by replaying a plan.
+    A plan given as the filename of one not yet saved is worked out from
+    the cubes and saved to it. Cubes whose metadata already match are
+    left as they are.
+    """
+    logger = log_module()
+    if plan is None:
+        if _consistent(loaded_cubes):
+            logger.info("Cube metadata matches, equalisation skipped\n")
+            return loaded_cubes
+        return compare_and_equalise(loaded_cubes, cube_files)
+    if isinstance(plan, string_types):
+        filename = plan
+        if not os.path.exists(filename):
+            plan = _compare_and_plan(loaded_cubes, cube_files)
+            plan.save(filename)
         else:
-            compare_cubes(loaded_cubes)
-            result = equalise_all(loaded_cubes)
-            result = iris.cube.CubeList(result)
-            try:
-                result = result.concatenate_cube()
-                return result
-            except iris.exceptions.ConcatenateError:
-                logger.info("\nThere was an error in concatenation\n")
-                err_msg = _examine_dim_bounds(result, cube_files)
-                logger.error(err_msg)
-                raise
-
-
-def _season_year(**kwargs):
-    iris.coord_categorisation.add_season_year(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='season_year')
-
-
-def _season_membership(**kwargs):
-    iris.coord_categorisation.add_season_membership(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='season_membership',
-        season=kwargs.get('season'))
-
-
-def _season_number(**kwargs):
-    iris.coord_categorisation.add_season_number(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='season_number',
-        seasons=kwargs.get('seasons'))
-
-
-def _season(**kwargs):
-    iris.coord_categorisation.add_season(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='season',
-        seasons=kwargs.get('seasons'))
-
-
-def _clim_season(**kwargs):
-    iris.coord_categorisation.add_season(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='clim_season',
-        seasons=kwargs.get('seasons'))
-
-
-def _year(**kwargs):
-    iris.coord_categorisation.add_year(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='year')
-
-
-def _month_number(**kwargs):
-    iris.coord_categorisation.add_month_number(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='month_number')
-
-
-def _month_fullname(**kwargs):
-    iris.coord_categorisation.add_month_fullname(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='month_fullname')
-
+            plan = EqualisationPlan.load(filename)
+    return plan.apply(loaded_cubes)
 
-def _month(**kwargs):
-    iris.coord_categorisation.add_month(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='month')
 
+def _concatenate_loaded(loaded_cubes, cube_files, lazy=False,
+                        time_chunks=None, plan=None):
+    logger = log_module()
+    if not loaded_cubes:
+        raise OSError("No cubes loaded")
+    lazy_cubes = [cube for cube in loaded_cubes if cube.has_lazy_data()]
+    result = _equalise_loaded(loaded_cubes, cube_files, plan)
+    if lazy:
+        _check_lazy(lazy_cubes, 'equalisation')
+    result = iris.cube.CubeList(result)
+    report = examine_time_extents(result, cube_files)
+    if report.overlaps or report.duplicates:
+        err_msg = _examine_dim_bounds(result, cube_files)
+        if _joins_along_time(result):
+            logger.info("\nThere was an error in concatenation\n")
+            logger.error(err_msg)
+            raise iris.exceptions.ConcatenateError([err_msg])
+        logger.debug(err_msg)
+    try:
+        result = result.concatenate_cube()
+    except iris.exceptions.ConcatenateError:
+        logger.info("\nThere was an error in concatenation\n")
+        err_msg = _examine_dim_bounds(result, cube_files)
+        logger.error(err_msg)
+        raise
+    if lazy and lazy_cubes:
+        _check_lazy(result, 'concatenation')
+    if time_chunks is not None:
+        result = _rechunk(result, {'time': time_chunks})
+    return result
+
+
+def load(directory, filetype='.nc', constraints=None, workers=None,
+         executor='thread', catalog=None, lazy=False, chunks=None,
+         time_chunks=None, plan=None):
+    """
+    A function that loads and concatenates Iris Cubes.
 
-def _day_of_month(**kwargs):
-    iris.coord_categorisation.add_day_of_month(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='day_of_month')
-
-
-def _day_of_year(**kwargs):
-
-    iris.coord_categorisation.add_day_of_year(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='day_of_year')
-
-
-def _weekday_number(**kwargs):
-    iris.coord_categorisation.add_weekday_number(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='weekday_number')
-
+    Args:
+        directory: A String specifying the directory or filename of the Cubes
+        you wish to concatenate. Accepts either directory location or a list
+        or glob object of individual Cubes.
 
-def _weekday_fullname(**kwargs):
-    iris.coord_categorisation.add_weekday_fullname(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='weekday_fullname')
+        filetype: Extension of Iris Cubes to Load. set to '.nc' by default.
+        constraints: Any constraints to be applied to Cubes on load.
 
+        workers: The number of workers to load files concurrently with.
+        Files are loaded serially by default.
 
-def _weekday(**kwargs):
-    iris.coord_categorisation.add_weekday(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='weekday')
+        executor: 'thread' or 'process' to load files in a thread or
+        process pool, or a concurrent.futures.Executor instance to load
+        files with. Set to 'thread' by default.
 
+        catalog: A Catalog, or the filename of one, to reuse the directory
+        listing and file metadata of previous loads from. Only used when
+        loading a directory.
 
-def _hour(**kwargs):
-    iris.coord_categorisation.add_hour(
-        kwargs.get('cube'),
-        kwargs.get('coord'),
-        name='hour')
+        lazy: If True, checks after comparing, equalising and
+        concatenating that the data of no lazily loaded Cube has been
+        realised, raising a RuntimeError if any has. Data is left lazy
+        throughout either way; this guards against it being read into
+        memory by accident. Note iris reads very small variables eagerly
+        on load. Set to False by default.
 
+        chunks: A target chunk size in MB, or a dict of chunk sizes keyed
+        by dimension name, e.g. {'time': 120}, to open each file with.
+        iris chooses the chunking by default.
 
-def _annual_seasonal_mean(**kwargs):
-    _clim_season(**kwargs)
-    _season_year(**kwargs)
+        time_chunks: The number of time points per chunk to rechunk the
+        concatenated Cube to, so that chunks run evenly along time
+        rather than following the files. Not rechunked by default.
 
+        plan: An EqualisationPlan, or the filename of one, to equalise
+        the Cubes with instead of comparing them. A plan filename which
+        does not exist yet is saved to after comparing the Cubes, so
+        later loads of the same model and variable replay it. By default
+        the Cubes are compared, unless a check of their metadata finds
+        they already match, in which case equalisation is skipped.
 
-def _add_categorical(cube, categorical, coord, season, seasons):
-    categorical_dict = {'season_year': _season_year,
-                        'season_membership': _season_membership,
-                        'season_number': _season_number,
-                        'annual_seasonal_mean': _annual_seasonal_mean,
-                        'number': _season_number,
-                        'clim_season': _clim_season,
-                        'season': _season,
-                        'year': _year,
-                        'month_number': _month_number,
-                        'month_fullname': _month_fullname,
-                        'month': _month,
-                        'day_of_month': _day_of_month,
-                        'day_of_year': _day_of_year,
-                        'weekday_number': _weekday_number,
-                        'weekday_fullname': _weekday_fullname,
-                        'weekday': _weekday,
-                        'hour': _hour
-                        }
+    Returns:
+        result: A concatenated Iris Cube.
+    """
+    if isinstance(directory, string_types):
+        loaded_cubes, cube_files = load_from_dir(
+            directory, filetype, constraints, workers, executor, catalog,
+            chunks)
+        return _concatenate_loaded(loaded_cubes, cube_files, lazy,
+                                   time_chunks, plan)
 
-    categorical_dict.get(categorical)(cube=cube,
-                                      categorical=categorical,
-                                      coord=coord,
-                                      season=season,
-                                      seasons=seasons)
+    elif isinstance(directory, list):
+        loaded_cubes, cube_files = load_from_filelist(
+            directory, filetype, constraints, workers, executor, chunks)
+        return _concatenate_loaded(loaded_cubes, cube_files, lazy,
+                                   time_chunks, plan)
+
+
+# The categorisation and coord name of each categorical add_categorical
+# adds, by the name it is requested by.
+_CATEGORICALS = {'season_year': ('season_year', 'season_year'),
+                 'season_membership': ('season_membership',
+                                       'season_membership'),
+                 'season_number': ('season_number', 'season_number'),
+                 'number': ('season_number', 'season_number'),
+                 'clim_season': ('season', 'clim_season'),
+                 'season': ('season', 'season'),
+                 'year': ('year', 'year'),
+                 'month_number': ('month_number', 'month_number'),
+                 'month_fullname': ('month_fullname', 'month_fullname'),
+                 'month': ('month', 'month'),
+                 'day_of_month': ('day_of_month', 'day_of_month'),
+                 'day_of_year': ('day_of_year', 'day_of_year'),
+                 'weekday_number': ('weekday_number', 'weekday_number'),
+                 'weekday_fullname': ('weekday_fullname',
+                                      'weekday_fullname'),
+                 'weekday': ('weekday', 'weekday'),
+                 'hour': ('hour', 'hour')}
+
+
+def _annual_seasonal_mean(cube, coord, season, seasons, fingerprint=None):
+    _add_categorical(cube, 'clim_season', coord, season, seasons,
+                     fingerprint)
+    _add_categorical(cube, 'season_year', coord, season, seasons,
+                     fingerprint)
+
+
+def _add_categorical(cube, categorical, coord, season, seasons,
+                     fingerprint=None):
+    if categorical == 'annual_seasonal_mean':
+        _annual_seasonal_mean(cube, coord, season, seasons, fingerprint)
+        return
+    category, name = _CATEGORICALS[categorical]
+    add_categorised(cube, coord, category, name=name, season=season,
+                    seasons=seasons, fingerprint=fingerprint)
+
+
+def _add_categoricals(cube, categoricals, coord, season, seasons):
+    # The coord is fingerprinted once for all of the categoricals added to
+    # the cube, which are reused from earlier cubes with the same
+    # fingerprint.
+    time_coord = coord
+    if not isinstance(time_coord, iris.coords.Coord):
+        time_coord = cube.coord(time_coord)
+    fingerprint = time_fingerprint(time_coord)
+    for categorical in categoricals:
+        _add_categorical(cube, categorical, time_coord, season, seasons,
+                         fingerprint)
 
 
 def add_categorical(cubes, categorical, coord='time', season='djf',
@@ -219,7 +224,13 @@ def add_categorical(cubes, categorical, coord='time', season='djf',
     """
     Adds a coordinate categorisation(s) to the iterable of Iris Cubes.
 
-    Currently this function provides a wrapper for the following
+    The categoricals are derived from integer date fields of the
+    coordinate's points with array arithmetic, and are identical to those
+    of iris.coord_categorisation. They are cached by a fingerprint of the
+    coordinate's points, units and calendar, so cubes sharing a time
+    axis, and repeated calls, reuse them.
+
+    Currently this function provides the following
     standalone and compound categoricals:
 
     day_of_month:
@@ -275,24 +286,15 @@ def add_categorical(cubes, categorical, coord='time', season='djf',
         or an Iris CubeList.
     """
     if isinstance(categorical, list):
-        for categorical in categorical:
-
-            if isinstance(cubes, list) or isinstance(cubes,
-                                                     iris.cube.CubeList):
-                for cube in cubes:
-                    _add_categorical(cube, categorical, coord, season, seasons)
-            else:
-                _add_categorical(cubes, categorical, coord, season, seasons)
-        return cubes
+        categoricals = categorical
     else:
-        if isinstance(cubes, list) or isinstance(cubes, iris.cube.CubeList):
-            for cube in cubes:
-                _add_categorical(cube, categorical, coord, season, seasons)
-            return cubes
-
-        else:
-            _add_categorical(cubes, categorical, coord, season, seasons)
-            return cubes
+        categoricals = [categorical]
+    if isinstance(cubes, list) or isinstance(cubes, iris.cube.CubeList):
+        for cube in cubes:
+            _add_categoricals(cube, categoricals, coord, season, seasons)
+    else:
+        _add_categoricals(cubes, categoricals, coord, season, seasons)
+    return cubes
 
 
 def aggregate_categorical(cube, categorical,
@@ -304,8 +306,21 @@ def aggregate_categorical(cube, categorical,
     aggregates them by the given categoricals. Categoricals used are the
     same as the ones suppourted by add_categorical().
 
+    Given a directory, or the per-file Cubes of one, e.g. from
+    load_from_dir, the Cubes are concatenated lazily and aggregated in a
+    stream, one file's data at a time, so only one file's data is held in
+    memory however long the record. Streaming supports the MEAN, SUM,
+    MIN, MAX, VARIANCE and STD_DEV aggregators.
+
+    Given a list of aggregators, the categoricals are added and the
+    groups found once. For lazy data, all of the statistics are computed
+    from a single read of the data where every aggregator supports
+    streaming. For realised data, each statistic is the same as given
+    the aggregator alone.
+
     Args:
-        cubes: A cube, a list of loaded Cubes or a CubeList.
+        cube: A cube, a list of per-file Cubes or a CubeList, or the
+        directory of the files to aggregate.
 
         categorical: A string or list of strings specifying
         the categorisation you wish to add. Additionally a compound
@@ -320,22 +335,34 @@ def aggregate_categorical(cube, categorical,
         seasons: The seasons required for categorisation.
 
         agg_method: An Iris aggregator object, e.g ``iris.analysis.MEAN``,
+        or a list of them.
 
     Returns:
-        cubes: A cube, a list of loaded Cubes, or an Iris CubeList
-        aggregated by a given categorical.
+        cube: A cube aggregated by a given categorical, or a CubeList of
+        one for each aggregator given a list of them.
     """
     compound_dict = {'annual_seasonal_mean': ['clim_season',
                                               'season_year']}
+    stream = False
+    if isinstance(cube, string_types):
+        cube = load(cube)
+        stream = True
+    elif isinstance(cube, list) or isinstance(cube, iris.cube.CubeList):
+        cube = concatenate(list(cube))
+        stream = True
     cube = add_categorical(cube, categorical, coord=coord, season=season,
                            seasons=seasons)
-    try:
-        categorical = compound_dict[categorical]
-        cube = cube.aggregated_by(categorical, agg_method)
-        return cube
-    except KeyError:
-        cube = cube.aggregated_by(categorical, agg_method)
-        return cube
+    categorical = compound_dict.get(categorical, categorical)
+    if not isinstance(categorical, list):
+        categorical = [categorical]
+    if isinstance(agg_method, list):
+        if stream or (cube.has_lazy_data() and
+                      all(streamable(method) for method in agg_method)):
+            return streamed_aggregated_by(cube, categorical, agg_method)
+        return grouped_aggregated_by(cube, categorical, agg_method)
+    if stream:
+        return streamed_aggregated_by(cube, categorical, agg_method)
+    return grouped_aggregated_by(cube, categorical, agg_method)
 
 
 def extract_categorical(cube,
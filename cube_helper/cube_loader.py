@@ -5,11 +5,39 @@
 # See LICENSE in the root of the repository for full licensing details.
 
 import os
+import re
 import iris
 import glob
-from iris.exceptions import MergeError, ConstraintMismatchError
+import contextlib
+import multiprocessing
+import dask
+import numpy as np
+from concurrent.futures import (Executor,
+                                ThreadPoolExecutor,
+                                ProcessPoolExecutor)
+from iris.exceptions import (MergeError,
+                             ConstraintMismatchError,
+                             CoordinateNotFoundError,
+                             CoordinateMultiDimError)
 from six import string_types
 from datetime import datetime
+from cube_helper.cube_scanner import scan_file
+from cube_helper.cube_catalog import Catalog
+from cube_helper.cube_calendar import DateFields, _date_fields
+try:
+    from iris.fileformats.netcdf.loader import CHUNK_CONTROL as _CHUNK_CONTROL
+except ImportError:
+    _CHUNK_CONTROL = None
+try:
+    from iris._constraints import _ColumnIndexManager
+except ImportError:
+    _ColumnIndexManager = None
+
+# Whether the iris constraint internals the vectorised time match
+# overrides are present; constraints match cell by cell otherwise.
+_VECTORISED_CONSTRAINTS = _ColumnIndexManager is not None and \
+    hasattr(iris.Constraint, '_CIM_extract') and \
+    hasattr(iris.Constraint, '_coordless_match')
 
 
 def _check_pdt_year(cell, partial_datetime):
@@ -61,20 +89,83 @@ def _check_pdt_microsecond(cell, partial_datetime):
         return cell.point.microsecond
 
 
+def _cell_matches(cell, partial_datetime):
+    return cell.point.year == _check_pdt_year(cell, partial_datetime) and \
+        cell.point.month == _check_pdt_month(cell, partial_datetime) and \
+        cell.point.day == _check_pdt_day(cell, partial_datetime) and \
+        cell.point.hour == _check_pdt_hour(cell, partial_datetime) and \
+        cell.point.minute == _check_pdt_minute(cell, partial_datetime) and \
+        cell.point.second == _check_pdt_second(cell, partial_datetime) and \
+        cell.point.microsecond == \
+        _check_pdt_microsecond(cell, partial_datetime)
+
+
+def _partial_datetime_mask(coord, partial_datetime):
+    """
+    Matches a PartialDateTime against every point of a time coordinate
+    at once. As with the _check_pdt functions, fields of the
+    PartialDateTime that are unset or zero match any value.
+
+    Args:
+        coord: the time coordinate to match.
+
+        partial_datetime: the iris.time.PartialDateTime to match.
+
+    Returns:
+        a boolean array, True where the coordinate points match.
+    """
+    fields = _date_fields(coord.points, coord.units)
+    mask = np.ones(coord.shape, dtype=bool)
+    for field in DateFields._fields:
+        value = getattr(partial_datetime, field)
+        if value:
+            mask &= getattr(fields, field) == value
+    return mask
+
+
+class _PartialDateTimeConstraint(iris.Constraint):
+    """
+    A time constraint that matches a PartialDateTime against the points
+    of a cube's time coordinate in one vectorised step, rather than
+    calling a function for every cell. Where the iris internals this
+    relies on are missing, it matches cell by cell instead.
+    """
+
+    def __init__(self, partial_datetime):
+        self.partial_datetime = partial_datetime
+        super(_PartialDateTimeConstraint, self).__init__(
+            time=self._cell_matches)
+
+    def _cell_matches(self, cell):
+        return _cell_matches(cell, self.partial_datetime)
+
+    if _VECTORISED_CONSTRAINTS:
+        def _CIM_extract(self, cube):
+            resultant_CIM = _ColumnIndexManager(cube.ndim or 1)
+            if not self._coordless_match(cube):
+                resultant_CIM.all_false()
+                return resultant_CIM
+            try:
+                coord = cube.coord('time')
+            except CoordinateNotFoundError:
+                resultant_CIM.all_false()
+                return resultant_CIM
+            dims = cube.coord_dims(coord)
+            if len(dims) > 1:
+                raise CoordinateMultiDimError("Cannot apply constraints to "
+                                              "multidimensional coordinates")
+            mask = _partial_datetime_mask(coord, self.partial_datetime)
+            if dims:
+                resultant_CIM[dims[0]] = mask
+            elif not mask.all():
+                resultant_CIM.all_false()
+            return resultant_CIM
+
+
 def _fix_partial_datetime(constraint):
     if isinstance(constraint._coord_values['time'], iris.time.PartialDateTime):
         part_datetime = constraint._coord_values['time']
-        new_constraint = iris.Constraint(
-            time=lambda cell:
-            cell.point.year == _check_pdt_year(cell, part_datetime) and
-            cell.point.month == _check_pdt_month(cell, part_datetime) and
-            cell.point.day == _check_pdt_day(cell, part_datetime) and
-            cell.point.hour == _check_pdt_hour(cell, part_datetime) and
-            cell.point.minute == _check_pdt_minute(cell, part_datetime) and
-            cell.point.second == _check_pdt_second(cell, part_datetime) and
-            cell.point.microsecond ==
-            _check_pdt_microsecond(cell, part_datetime))
-        return new_constraint
+        return _PartialDateTimeConstraint(part_datetime)
     else:
         return constraint
 
@@ -87,6 +178,295 @@ def _constraint_compatible(constraint, cube):
         return False
 
 
+_FILENAME_DATES = re.compile(r'_(\d{4,14})-(\d{4,14})(?:-clim)?\.[^.]*$')
+
+_DATE_FIELDS = ('year', 'month', 'day', 'hour', 'minute', 'second')
+
+
+def _time_prefix(constraint):
+    """
+    Finds the leading date fields of a PartialDateTime time constraint,
+    which every matching time must share.
+
+    Args:
+        constraint: an iris.Constraint.
+
+    Returns:
+        a tuple of the set fields from the year onwards, e.g. (2000, 3)
+        for PartialDateTime(year=2000, month=3), or None if the
+        constraint does not restrict the year.
+    """
+    coord_values = getattr(constraint, '_coord_values', {})
+    part_datetime = coord_values.get('time')
+    if not isinstance(part_datetime, iris.time.PartialDateTime):
+        return None
+    prefix = []
+    for field in _DATE_FIELDS:
+        value = getattr(part_datetime, field)
+        if not value:
+            break
+        prefix.append(value)
+    return tuple(prefix) or None
+
+
+def _parse_filename_date(date_string):
+    if len(date_string) % 2:
+        return None
+    date = [int(date_string[:4])]
+    for i in range(4, len(date_string), 2):
+        date.append(int(date_string[i:i + 2]))
+    return tuple(date)
+
+
+def _filename_time_span(path):
+    """
+    Reads the time span of a file from the CMIP filename convention,
+    e.g. tas_Amon_..._185001-185912.nc
+
+    Args:
+        path: the filename.
+
+    Returns:
+        start, end: date tuples of the first and last periods covered
+        by the file, to the precision given in the filename, or None if
+        the filename does not follow the convention.
+    """
+    match = _FILENAME_DATES.search(os.path.basename(path))
+    if not match:
+        return None
+    start = _parse_filename_date(match.group(1))
+    end = _parse_filename_date(match.group(2))
+    if start is None or end is None:
+        return None
+    return start, end
+
+
+def _date_tuple(date):
+    return tuple(getattr(date, field) for field in _DATE_FIELDS)
+
+
+def _path_records(path, catalog=None):
+    """
+    Reads the header metadata of a file, from the catalog if one is
+    given. Returns None if the file cannot be scanned.
+    """
+    if catalog is not None:
+        return catalog.records(path)
+    try:
+        return scan_file(path)
+    except (IOError, OSError):
+        return None
+
+
+def _header_time_span(records):
+    """
+    Finds the time span of a file from its scanned header metadata.
+
+    Args:
+        records: a list of FileMetadata records for the file, or None.
+
+    Returns:
+        start, end: date tuples of the earliest and latest times in the
+        file, or None if the file has no time coordinate.
+    """
+    for record in records or []:
+        if record.time_units is not None and record.time_start is not None:
+            return (_date_tuple(record.time_units.num2date(record.time_start)),
+                    _date_tuple(record.time_units.num2date(record.time_end)))
+    return None
+
+
+def _prune_paths(paths, constraint, catalog=None):
+    """
+    Removes files that cannot satisfy a PartialDateTime time constraint,
+    working out each file's time span from its name where it follows
+    the CMIP convention and from its header otherwise, so the skipped
+    files are never loaded.
+
+    Args:
+        paths: a list of filenames.
+
+        constraint: the iris.Constraint the files are to be loaded with.
+
+        catalog (optional): a Catalog to read file headers from.
+
+    Returns:
+        a list of the paths which may hold times matching the constraint.
+    """
+    prefix = _time_prefix(constraint)
+    if prefix is None:
+        return paths
+    kept_paths = []
+    for path in paths:
+        span = _filename_time_span(path)
+        if span is None:
+            span = _header_time_span(_path_records(path, catalog))
+        if span is None:
+            kept_paths.append(path)
+            continue
+        start, end = span
+        n = min(len(prefix), len(start), len(end))
+        if start[:n] <= prefix[:n] <= end[:n]:
+            kept_paths.append(path)
+    return kept_paths
+
+
+def _rechunk(cube, chunks):
+    """
+    Rechunks the lazy data of a cube, leaving real data untouched.
+
+    Args:
+        cube: the Cube to rechunk.
+
+        chunks: a dict of chunk sizes keyed by dimension coordinate name.
+        Coordinates the cube does not have are ignored.
+
+    Returns:
+        the rechunked Cube.
+    """
+    if not cube.has_lazy_data():
+        return cube
+    axes = {}
+    for name, size in chunks.items():
+        try:
+            dims = cube.coord_dims(name)
+        except CoordinateNotFoundError:
+            continue
+        if len(dims) == 1:
+            axes[dims[0]] = size
+    if axes:
+        cube.data = cube.lazy_data().rechunk(axes)
+    return cube
+
+
+@contextlib.contextmanager
+def _chunking(chunks):
+    """
+    A context manager under which iris opens netCDF files with the given
+    chunking. A dict of chunk sizes applies to the current thread only,
+    while a chunk size in MB sets the dask config of the whole process.
+
+    Args:
+        chunks: None to leave iris to choose, a number giving the target
+        chunk size in MB, or a dict of chunk sizes keyed by dimension
+        name.
+    """
+    if chunks is None or (isinstance(chunks, dict) and
+                          _CHUNK_CONTROL is None):
+        yield
+    elif isinstance(chunks, dict):
+        with _CHUNK_CONTROL.set(**chunks):
+            yield
+    else:
+        with dask.config.set({'array.chunk-size': '{}MB'.format(chunks)}):
+            yield
+
+
+def _load_file_cubes(path, constraint=None):
+    """
+    Loads the cubes of a single file, falling back to iris.load_raw
+    should the file not load as a single cube.
+    """
+    try:
+        return [iris.load_cube(path, constraint)]
+    except (MergeError, ConstraintMismatchError):
+        return [cube for cube in iris.load_raw(path, constraint)
+                if isinstance(cube.standard_name, str)]
+
+
+def _load_path(path, constraint=None, chunks=None):
+    """
+    Loads a single file, falling back to iris.load_raw should the file
+    not load as a single cube. The sort key of each cube is recorded
+    as it is loaded so the file need not be read again to sort it.
+
+    Args:
+        path: the filename to load.
+
+        constraint (optional): an iris.Constraint to load the file with.
+
+        chunks (optional): a target chunk size in MB, or a dict of chunk
+        sizes keyed by dimension name, to open the file with.
+
+    Returns:
+        a list of (sort_key, cube, path) tuples loaded from the file.
+    """
+    with _chunking(chunks):
+        cubes = _load_file_cubes(path, constraint)
+    if isinstance(chunks, dict) and _CHUNK_CONTROL is None:
+        cubes = [_rechunk(cube, chunks) for cube in cubes]
+    return [(sort_by_earliest_date(cube), cube, path) for cube in cubes]
+
+
+def _load_paths(paths, constraint=None, workers=None, executor='thread',
+                chunks=None):
+    """
+    Loads each of the given paths, concurrently if a number of workers
+    or an executor is given, and sorts the loaded cubes by date from
+    earliest to latest.
+
+    Args:
+        paths: a list of filenames to load.
+
+        constraint (optional): an iris.Constraint to load each file with.
+
+        workers (optional): the number of workers to load files with.
+        Files are loaded serially if neither this nor an executor
+        instance is given.
+
+        executor (optional): either 'thread' or 'process' to choose the
+        kind of pool started with workers, or a
+        concurrent.futures.Executor instance to load the files with.
+
+        chunks (optional): a target chunk size in MB, or a dict of chunk
+        sizes keyed by dimension name, to open each file with.
+
+    Returns:
+        loaded_cubes, cube_files: the sorted cubes and their respective
+        filenames, so that cube_files[i] is the file loaded_cubes[i]
+        was loaded from.
+    """
+    in_process = not isinstance(executor, ProcessPoolExecutor) and \
+        not (workers and executor == 'process')
+    if in_process and chunks is not None and not isinstance(chunks, dict):
+        # The dask config is global to the process, so the chunk size is
+        # set once around the whole load rather than by each thread.
+        load_chunking = _chunking(chunks)
+        chunks = None
+    else:
+        load_chunking = _chunking(None)
+    constraints = [constraint] * len(paths)
+    chunk_sizes = [chunks] * len(paths)
+    with load_chunking:
+        if isinstance(executor, Executor):
+            results = list(executor.map(_load_path, paths, constraints,
+                                        chunk_sizes))
+        elif workers:
+            if executor == 'thread':
+                pool = ThreadPoolExecutor(max_workers=workers)
+            elif executor == 'process':
+                # Forked workers can inherit HDF5 locks held by the
+                # parent, so start them fresh instead.
+                pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+            else:
+                raise ValueError("executor must be 'thread', 'process' or "
+                                 "an Executor instance, not "
+                                 "{}".format(executor))
+            with pool:
+                results = list(pool.map(_load_path, paths, constraints,
+                                        chunk_sizes))
+        else:
+            results = [_load_path(path, constraint, chunks)
+                       for path in paths]
+    loaded = [item for items in results for item in items]
+    loaded.sort(key=lambda item: item[0])
+    loaded_cubes = [cube for _, cube, _ in loaded]
+    cube_files = [path for _, _, path in loaded]
+    return loaded_cubes, cube_files
+
+
 def _parse_directory(directory):
     """
     Parses the string representing the directory, makes sure a '/'
@@ -114,21 +494,18 @@ def _parse_directory(directory):
         return directory
 
 
-def _sort_by_date(time_coord):
+def _sort_by_units(time_units):
     """
-    Private sorting function used by _file
-    _sort_by_earliest_date() and sort_by_earl
-    iest_date().
+    Private sorting function used by _sort_by_date() and
+    file_sort_by_earliest_date().
 
     Args:
-        time_coord: Cube time coordinate for each cube
-        to be sorted by.
+        time_units: The cf_units.Unit of a time coordinate.
 
     Returns:
-        time_origin: The time origin to sort cubes
-        by, as a specific start date e.g 1850.
+        time_origin: The time origin of the units, as a datetime.
     """
-    time_origin = time_coord.units.num2date(0)
+    time_origin = time_units.num2date(0)
     if not isinstance(time_origin, datetime):
         if time_origin.datetime_compatible:
             time_origin = time_origin._to_real_datetime()
@@ -139,9 +516,27 @@ def _sort_by_date(time_coord):
     return time_origin
 
 
+def _sort_by_date(time_coord):
+    """
+    Private sorting function used by _file
+    _sort_by_earliest_date() and sort_by_earl
+    iest_date().
+
+    Args:
+        time_coord: Cube time coordinate for each cube
+        to be sorted by.
+
+    Returns:
+        time_origin: The time origin to sort cubes
+        by, as a specific start date e.g 1850.
+    """
+    return _sort_by_units(time_coord.units)
+
+
 def file_sort_by_earliest_date(cube_filename):
     """
-    Sorts file names by date from earliest to latest.
+    Sorts file names by date from earliest to latest. netCDF files are
+    sorted from their headers alone, other files are loaded with iris.
 
     Args:
         cube_filename: list of files in string format to sort,
@@ -150,6 +545,14 @@ def file_sort_by_earliest_date(cube_filename):
     Returns:
         datetime object of selected Cubes start time.
     """
+    try:
+        records = scan_file(cube_filename)
+    except (IOError, OSError):
+        records = []
+    for record in records:
+        if isinstance(record.standard_name, string_types) and \
+                record.time_units is not None:
+            return _sort_by_units(record.time_units)
     raw_cubes = iris.load_raw(cube_filename)
     if isinstance(raw_cubes, iris.cube.CubeList):
         for cube in raw_cubes:
@@ -183,7 +586,150 @@ def sort_by_earliest_date(cube):
             return time_origin
 
 
-def load_from_dir(directory, filetype, constraint=None):
+def _find_paths(directory, filetype, catalog=None):
+    """
+    Lists the files of a given type in a directory, from the catalog if
+    one is given.
+
+    Args:
+        directory: the directory to search.
+
+        filetype: the extension of the files to find.
+
+        catalog (optional): a Catalog, or the filename of one.
+
+    Returns:
+        cube_paths, catalog: the filenames found and the Catalog used,
+        if any, having been updated with their metadata.
+    """
+    directory = _parse_directory(directory)
+    if catalog is None:
+        return glob.glob(directory + '*' + filetype), None
+    if isinstance(catalog, string_types):
+        catalog = Catalog(catalog)
+    cube_paths = catalog.paths(directory, filetype)
+    for path in cube_paths:
+        catalog.records(path)
+    catalog.save()
+    return cube_paths, catalog
+
+
+def _needs_partial_datetime_fix(paths, constraint, catalog=None):
+    """
+    Decides once for a whole load whether a constraint must be swapped
+    for its _PartialDateTimeConstraint form. iris cannot compare a
+    PartialDateTime against a time cell with bounds, so this is only
+    needed for PartialDateTime time constraints on files whose time
+    coordinates have bounds, which is read from the file headers. A file
+    is only probed with iris if its header can't be read.
+
+    Args:
+        paths: a non-empty list of the filenames to be loaded.
+
+        constraint: the iris.Constraint to load the files with.
+
+        catalog (optional): a Catalog to read file headers from.
+
+    Returns:
+        True if the constraint should be replaced, False otherwise.
+    """
+    coord_values = getattr(constraint, '_coord_values', {})
+    if not isinstance(coord_values.get('time'),
+                      iris.time.PartialDateTime):
+        return False
+    for path in paths:
+        records = _path_records(path, catalog)
+        if records is None:
+            if any(cube.coord('time').has_bounds()
+                   for cube in _load_file_cubes(path)
+                   if cube.coords('time')):
+                return True
+        elif any(record.time_bounds for record in records):
+            return True
+    return False
+
+
+def _resolve_constraint(paths, constraint, catalog=None):
+    """
+    Drops the files that cannot satisfy a constraint and works out the
+    form of the constraint the remaining files should be loaded with.
+
+    Args:
+        paths: a list of filenames to load.
+
+        constraint: the iris.Constraint to load the files with, or None.
+
+        catalog (optional): a Catalog to read file headers from.
+
+    Returns:
+        paths, constraint: the files to load and the constraint to load
+        them with.
+    """
+    if constraint is None:
+        return paths, constraint
+    paths = _prune_paths(paths, constraint, catalog)
+    if paths and _needs_partial_datetime_fix(paths, constraint, catalog):
+        constraint = _fix_partial_datetime(constraint)
+    return paths, constraint
+
+
+def _file_time_key(path, catalog=None):
+    """
+    Sort key ordering files by the earliest time they hold, read from
+    the filename where it follows the CMIP convention and from the
+    header otherwise. Files with no known times are ordered last.
+    """
+    span = _filename_time_span(path)
+    if span is None:
+        span = _header_time_span(_path_records(path, catalog))
+    if span is None:
+        return 1, ()
+    return 0, span[0]
+
+
+def iter_cubes(directory, filetype='.nc', constraint=None, catalog=None,
+               chunks=None):
+    """
+    Loads cubes one file at a time, yielding each as soon as its file is
+    parsed so that only one file's cubes need be held in memory at once.
+    Files are ordered by the earliest time they hold, worked out from
+    their names or headers before any are loaded.
+
+    Args:
+        directory: a directory to load from, or a list of filenames.
+
+        filetype (optional): the extension of the files to load. Set to
+        '.nc' by default.
+
+        constraint (optional): an iris.Constraint to load each file with.
+        Files that cannot hold any times matching a PartialDateTime time
+        constraint are skipped.
+
+        catalog (optional): a Catalog, or the filename of one, to reuse
+        the directory listing and file metadata of previous loads from.
+
+        chunks (optional): a target chunk size in MB, or a dict of chunk
+        sizes keyed by dimension name, e.g. {'time': 120}, to open each
+        file with. iris chooses the chunking by default.
+
+    Yields:
+        (path, cube) pairs, in time order.
+    """
+    if isinstance(directory, string_types):
+        paths, catalog = _find_paths(directory, filetype, catalog)
+    else:
+        if isinstance(catalog, string_types):
+            catalog = Catalog(catalog)
+        paths = [path for path in directory if path.endswith(filetype)]
+    paths, constraint = _resolve_constraint(paths, constraint, catalog)
+    paths.sort(key=lambda path: _file_time_key(path, catalog))
+    for path in paths:
+        for _, cube, _ in _load_path(path, constraint, chunks):
+            yield path, cube
+
+
+def load_from_dir(directory, filetype, constraint=None, workers=None,
+                  executor='thread', catalog=None, chunks=None):
     """
     Loads a set of cubes from a given directory, single cubes are loaded
     and returned as a CubeList.
@@ -197,52 +743,38 @@ def load_from_dir(directory, filetype, constraint=None):
         Of files found in the dataset.
 
         constraints (optional): a string specifying any constraints
-        You wish to load the dataset with.
+        You wish to load the dataset with. Files that cannot hold any
+        times matching a PartialDateTime time constraint are skipped
+        without being loaded.
+
+        workers (optional): the number of workers to load files
+        concurrently with. Files are loaded serially by default.
+
+        executor (optional): 'thread' or 'process' to load files in a
+        thread or process pool of the given number of workers, or a
+        concurrent.futures.Executor instance to load files with.
+        Set to 'thread' by default.
+
+        catalog (optional): a Catalog, or the filename of one, to reuse
+        the directory listing and file metadata of previous loads from.
+        The catalog is updated with any new or changed files.
+
+        chunks (optional): a target chunk size in MB, or a dict of chunk
+        sizes keyed by dimension name, e.g. {'time': 120}, to open each
+        file with. iris chooses the chunking by default.
 
     Returns:
         iris.cube.CubeList(loaded_cubes), a CubeList of the loaded
-        Cubes.
+        Cubes, and cube_files, the file each Cube was loaded from.
     """
-    if constraint is None:
-        loaded_cubes = []
-        cube_files = []
-        directory = _parse_directory(directory)
-        cube_paths = glob.glob(directory + '*' + filetype)
-        for path in cube_paths:
-            try:
-                loaded_cubes.append(iris.load_cube(path))
-                cube_files.append(path)
-            except (MergeError, ConstraintMismatchError):
-                for cube in iris.load_raw(path):
-                    if isinstance(cube.standard_name, str):
-                        loaded_cubes.append(cube)
-                        cube_files.append(path)
-        loaded_cubes.sort(key=sort_by_earliest_date)
-        cube_files.sort(key=file_sort_by_earliest_date)
-        return loaded_cubes, cube_files
-    else:
-        loaded_cubes = []
-        cube_files = []
-        directory = _parse_directory(directory)
-        cube_paths = glob.glob(directory + '*' + filetype)
-        if not _constraint_compatible(constraint,
-                                      iris.load_cube(cube_paths[0])):
-            constraint = _fix_partial_datetime(constraint)
-        for path in cube_paths:
-            try:
-                loaded_cubes.append(iris.load_cube(path, constraint))
-                cube_files.append(path)
-            except (MergeError, ConstraintMismatchError):
-                for cube in iris.load_raw(path, constraint):
-                    if isinstance(cube.standard_name, str):
-                        loaded_cubes.append(cube)
-                        cube_files.append(path)
-        loaded_cubes.sort(key=sort_by_earliest_date)
-        cube_files.sort(key=file_sort_by_earliest_date)
-        return loaded_cubes, cube_files
+    cube_paths, catalog = _find_paths(directory, filetype, catalog)
+    cube_paths, constraint = _resolve_constraint(cube_paths, constraint,
+                                                 catalog)
+    return _load_paths(cube_paths, constraint, workers, executor, chunks)
 
 
-def load_from_filelist(paths, filetype, constraint=None):
+def load_from_filelist(paths, filetype, constraint=None, workers=None,
+                       executor='thread', chunks=None):
     """
     Loads the specified files. Individual files are
     returned in a
@@ -256,42 +788,29 @@ def load_from_filelist(paths, filetype, constraint=None):
 
         constraints (optional): a string, iterable of strings or an
         iris.Constraint specifying any constraints you wish to load
-        the dataset with.
+        the dataset with. Files that cannot hold any times matching a
+        PartialDateTime time constraint are skipped without being
+        loaded.
+
+        workers (optional): the number of workers to load files
+        concurrently with. Files are loaded serially by default.
+
+        executor (optional): 'thread' or 'process' to load files in a
+        thread or process pool of the given number of workers, or a
+        concurrent.futures.Executor instance to load files with.
+        Set to 'thread' by default.
+
+        chunks (optional): a target chunk size in MB, or a dict of chunk
+        sizes keyed by dimension name, e.g. {'time': 120}, to open each
+        file with. iris chooses the chunking by default.
 
     Returns:
         iris.cube.CubeList(loaded_cubes), a CubeList of the loaded
-        Cubes.
+        Cubes, and cube_files, the file each Cube was loaded from.
     """
-    loaded_cubes = []
-    cube_files = []
     for filename in paths:
         if not filename.endswith(filetype):
             paths.remove(filename)
 
-    for filename in paths:
-        if constraint is None:
-            try:
-                loaded_cubes.append(iris.load_cube(filename))
-                cube_files.append(filename)
-            except (MergeError, ConstraintMismatchError):
-                for cube in iris.load_raw(filename):
-                    if isinstance(cube.standard_name, str):
-                        loaded_cubes.append(cube)
-                        cube_files.append(filename)
-
-        else:
-            if not _constraint_compatible(constraint,
-                                          iris.load_cube(paths[0])):
-                constraint = _fix_partial_datetime(constraint)
-            try:
-                loaded_cubes.append(iris.load_cube(filename, constraint))
-                cube_files.append(filename)
-            except (MergeError, ConstraintMismatchError):
-                for cube in iris.load_raw(filename, constraint):
-                    if isinstance(cube.standard_name, str):
-                        loaded_cubes.append(iris.load_raw(filename,
-                                                          constraint))
-                        cube_files.append(filename)
-    loaded_cubes.sort(key=sort_by_earliest_date)
-    cube_files.sort(key=file_sort_by_earliest_date)
-    return loaded_cubes, cube_files
+    paths, constraint = _resolve_constraint(paths, constraint)
+    return _load_paths(paths, constraint, workers, executor, chunks)
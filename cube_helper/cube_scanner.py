@@ -0,0 +1,190 @@
+# (C) Crown Copyright, Met Office. All rights reserved.
+#
+# This file is part of cube_helper and is released under the
+# BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+
+from __future__ import (absolute_import, division, print_function)
+from collections import namedtuple
+import netCDF4
+import numpy as np
+import cf_units
+
+FileMetadata = namedtuple('FileMetadata', ['path',
+                                           'var_name',
+                                           'standard_name',
+                                           'long_name',
+                                           'units',
+                                           'shape',
+                                           'dtype',
+                                           'dim_coords',
+                                           'aux_coords',
+                                           'attributes',
+                                           'time_units',
+                                           'time_start',
+                                           'time_end',
+                                           'time_bounds'])
+
+CoordMetadata = namedtuple('CoordMetadata', ['var_name',
+                                             'standard_name',
+                                             'long_name',
+                                             'units',
+                                             'shape'])
+
+_REFERENCE_ATTRS = ('bounds', 'climatology', 'grid_mapping',
+                    'cell_measures', 'ancillary_variables',
+                    'formula_terms', 'coordinates')
+
+_CF_VARIABLE_ATTRS = ('standard_name', 'long_name', 'units', 'calendar',
+                      'axis', 'positive', 'cell_methods', '_FillValue',
+                      'missing_value', 'scale_factor', 'add_offset',
+                      'valid_min', 'valid_max', 'valid_range') + \
+    _REFERENCE_ATTRS
+
+
+def _referenced_names(dataset):
+    """
+    Finds the names of all variables referenced by another variable,
+    i.e. coordinates, bounds, grid mappings and the like.
+
+    Args:
+        dataset: an open netCDF4.Dataset.
+
+    Returns:
+        a set of referenced variable names.
+    """
+    names = set()
+    for variable in dataset.variables.values():
+        for attr in _REFERENCE_ATTRS:
+            value = getattr(variable, attr, None)
+            if isinstance(value, str):
+                for word in value.replace(':', ' ').split():
+                    if word in dataset.variables:
+                        names.add(word)
+    return names
+
+
+def _coord_metadata(variable):
+    return CoordMetadata(var_name=variable.name,
+                         standard_name=getattr(variable, 'standard_name',
+                                               None),
+                         long_name=getattr(variable, 'long_name', None),
+                         units=getattr(variable, 'units', None),
+                         shape=variable.shape)
+
+
+def _is_time_variable(variable):
+    units = getattr(variable, 'units', '')
+    return isinstance(units, str) and ' since ' in units and \
+        (getattr(variable, 'standard_name', None) == 'time' or
+         getattr(variable, 'axis', None) == 'T' or
+         variable.name == 'time')
+
+
+def _time_range(dataset, variable):
+    """
+    Reads the extent of a 1-D time variable, from its bounds where they
+    exist and its points otherwise.
+
+    Args:
+        dataset: an open netCDF4.Dataset.
+
+        variable: the time netCDF4.Variable.
+
+    Returns:
+        time_units, time_start, time_end, time_bounds: a cf_units.Unit
+        including the calendar, the earliest and latest times in those
+        units, and whether the time variable has bounds.
+    """
+    time_units = cf_units.Unit(variable.units,
+                               getattr(variable, 'calendar', 'standard'))
+    bounds_name = getattr(variable, 'bounds',
+                          getattr(variable, 'climatology', None))
+    time_bounds = bounds_name in dataset.variables
+    if time_bounds:
+        values = dataset.variables[bounds_name]
+    else:
+        values = variable
+    values.set_auto_mask(False)
+    values = np.asarray(values[:])
+    if not values.size:
+        return time_units, None, None, time_bounds
+    return time_units, values.min(), values.max(), time_bounds
+
+
+def scan_file(path):
+    """
+    Reads the metadata of each data variable in a netCDF file from the
+    file header and its time variable, without loading any data or
+    building any cubes.
+
+    Args:
+        path: the netCDF file to scan.
+
+    Returns:
+        a list of FileMetadata records, one for each data variable in the
+        file. Coordinate details are given as CoordMetadata records.
+    """
+    records = []
+    with netCDF4.Dataset(path) as dataset:
+        referenced = _referenced_names(dataset)
+        global_attrs = {attr: dataset.getncattr(attr)
+                        for attr in dataset.ncattrs()}
+        for variable in dataset.variables.values():
+            if variable.name in dataset.dimensions or \
+                    variable.name in referenced or not variable.dimensions:
+                continue
+            dim_coords = tuple(
+                _coord_metadata(dataset.variables[dim])
+                for dim in variable.dimensions
+                if dim in dataset.variables)
+            aux_names = getattr(variable, 'coordinates', '').split()
+            aux_coords = tuple(
+                _coord_metadata(dataset.variables[name])
+                for name in aux_names if name in dataset.variables)
+            attributes = dict(global_attrs)
+            attributes.update({attr: variable.getncattr(attr)
+                               for attr in variable.ncattrs()
+                               if attr not in _CF_VARIABLE_ATTRS})
+            time_units, time_start, time_end = None, None, None
+            time_bounds = False
+            for name in variable.dimensions + tuple(aux_names):
+                if name in dataset.variables and \
+                        _is_time_variable(dataset.variables[name]) and \
+                        len(dataset.variables[name].shape) == 1:
+                    time_units, time_start, time_end, time_bounds = \
+                        _time_range(dataset, dataset.variables[name])
+                    break
+            records.append(FileMetadata(
+                path=path,
+                var_name=variable.name,
+                standard_name=getattr(variable, 'standard_name', None),
+                long_name=getattr(variable, 'long_name', None),
+                units=getattr(variable, 'units', None),
+                shape=variable.shape,
+                dtype=variable.dtype,
+                dim_coords=dim_coords,
+                aux_coords=aux_coords,
+                attributes=attributes,
+                time_units=time_units,
+                time_start=time_start,
+                time_end=time_end,
+                time_bounds=time_bounds))
+    return records
+
+
+def scan_files(paths):
+    """
+    Scans the headers of each of the given netCDF files.
+
+    Args:
+        paths: an iterable of netCDF filenames.
+
+    Returns:
+        a list of FileMetadata records for every data variable in every
+        file, in the order of paths.
+    """
+    records = []
+    for path in paths:
+        records.extend(scan_file(path))
+    return records
@@ -0,0 +1,145 @@
+# (C) Crown Copyright, Met Office. All rights reserved.
+#
+# This file is part of cube_helper and is released under the
+# BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+import unittest
+import warnings
+import numpy as np
+import dask.array as da
+import cf_units
+import iris
+import iris.analysis
+import iris.coord_categorisation
+from iris.coords import DimCoord
+from iris.cube import Cube
+from cube_helper.cube_aggregator import (grouped_aggregated_by,
+                                         streamed_aggregated_by,
+                                         _group_index)
+
+
+class TestCubeAggregator(unittest.TestCase):
+
+    def setUp(self):
+        super(TestCubeAggregator, self).setUp()
+        data = np.ma.masked_array(
+            np.random.RandomState(0).rand(800, 3, 2).astype('f4'))
+        data[5:300, 0, 0] = np.ma.masked
+        data[:, 1, 1] = np.ma.masked
+        data[400, 2, 1] = np.ma.masked
+        cube = Cube(data)
+        cube.add_dim_coord(DimCoord(np.arange(800.),
+                                    standard_name='time',
+                                    units=cf_units.Unit(
+                                        'days since 2000-01-01',
+                                        '360_day')), 0)
+        iris.coord_categorisation.add_season(cube, 'time', 'clim_season')
+        iris.coord_categorisation.add_season_year(cube, 'time')
+        self.cube = cube.copy(data=da.from_array(data, chunks=(77, 3, 2)))
+        self.aggregators = [iris.analysis.MEAN, iris.analysis.SUM,
+                            iris.analysis.MIN, iris.analysis.MAX,
+                            iris.analysis.VARIANCE, iris.analysis.STD_DEV]
+
+    def _assert_matches_iris(self, cube, coords, aggregator):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            expected = cube.aggregated_by(coords, aggregator)
+            result = streamed_aggregated_by(cube, coords, aggregator)
+        self.assertEqual(result.metadata, expected.metadata)
+        self.assertEqual(result.coords(), expected.coords())
+        self.assertEqual(result.dtype, expected.dtype)
+        np.testing.assert_array_equal(np.ma.getmaskarray(result.data),
+                                      np.ma.getmaskarray(expected.data))
+        np.testing.assert_allclose(np.ma.filled(result.data, 0),
+                                   np.ma.filled(expected.data, 0),
+                                   rtol=2e-5)
+
+    def test_streamed_aggregated_by(self):
+        for aggregator in self.aggregators:
+            for coords in [['clim_season'], ['clim_season', 'season_year']]:
+                self._assert_matches_iris(self.cube, coords, aggregator)
+
+    def test_streamed_aggregated_by_list(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            results = streamed_aggregated_by(self.cube, ['clim_season'],
+                                             self.aggregators)
+            self.assertIsInstance(results, iris.cube.CubeList)
+            for result, aggregator in zip(results, self.aggregators):
+                self.assertEqual(result,
+                                 streamed_aggregated_by(self.cube,
+                                                        ['clim_season'],
+                                                        aggregator))
+
+    def test_streamed_aggregated_by_axis(self):
+        cube = Cube(da.from_array(np.random.RandomState(1).rand(3, 800),
+                                  chunks=(3, 100)))
+        cube.add_dim_coord(DimCoord(np.arange(800.),
+                                    standard_name='time',
+                                    units=cf_units.Unit(
+                                        'days since 2000-01-01',
+                                        'noleap')), 1)
+        iris.coord_categorisation.add_season_year(cube, 'time')
+        for aggregator in self.aggregators:
+            self._assert_matches_iris(cube, ['season_year'], aggregator)
+
+    def test_streamed_aggregated_by_unsupported(self):
+        self.assertRaises(ValueError, streamed_aggregated_by, self.cube,
+                          ['clim_season'], iris.analysis.MEDIAN)
+
+    def _assert_grouped_matches_iris(self, cube, coords, aggregator):
+        expected = cube.aggregated_by(coords, aggregator)
+        result = grouped_aggregated_by(cube, coords, aggregator)
+        self.assertEqual(result.metadata, expected.metadata)
+        self.assertEqual(result.coords(), expected.coords())
+        self.assertEqual(result.dtype, expected.dtype)
+        np.testing.assert_array_equal(result.data, expected.data)
+
+    def test_grouped_aggregated_by(self):
+        cube = self.cube.copy(data=np.ma.getdata(self.cube.data))
+        int_cube = cube.copy(data=(cube.data * 100).astype('i4'))
+        for aggregator in self.aggregators:
+            for coords in [['clim_season'], ['season_year'],
+                           ['clim_season', 'season_year']]:
+                self._assert_grouped_matches_iris(cube, coords, aggregator)
+                self._assert_grouped_matches_iris(int_cube, coords,
+                                                  aggregator)
+        self._assert_grouped_matches_iris(self.cube, ['clim_season'],
+                                          iris.analysis.MEDIAN)
+
+    def test_grouped_aggregated_by_axis(self):
+        cube = Cube(np.random.RandomState(1).rand(3, 800))
+        cube.add_dim_coord(DimCoord(np.arange(800.),
+                                    standard_name='time',
+                                    units=cf_units.Unit(
+                                        'days since 2000-01-01',
+                                        'noleap')), 1)
+        iris.coord_categorisation.add_season(cube, 'time')
+        for aggregator in self.aggregators:
+            self._assert_grouped_matches_iris(cube, ['season'], aggregator)
+        cube = Cube((280 + np.random.RandomState(2).rand(
+            40, 9, 3650)).astype('f4'))
+        cube.add_dim_coord(DimCoord(np.arange(3650.),
+                                    standard_name='time',
+                                    units=cf_units.Unit(
+                                        'days since 2000-01-01',
+                                        '360_day')), 2)
+        iris.coord_categorisation.add_season(cube, 'time', 'clim_season')
+        iris.coord_categorisation.add_season_year(cube, 'time')
+        for aggregator in self.aggregators:
+            self._assert_grouped_matches_iris(
+                cube, ['clim_season', 'season_year'], aggregator)
+
+    def test_group_index(self):
+        index = _group_index(np.array([0, 0, 1, 1, 1, 2]))
+        self.assertIsNone(index.order)
+        np.testing.assert_array_equal(index.starts, [0, 2, 5])
+        np.testing.assert_array_equal(index.counts, [2, 3, 1])
+        index = _group_index(np.array([1, 0, 1, 2, 0]))
+        np.testing.assert_array_equal(index.order, [1, 4, 0, 2, 3])
+        np.testing.assert_array_equal(index.starts, [0, 2, 4])
+        np.testing.assert_array_equal(index.counts, [2, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# (C) Crown Copyright, Met Office. All rights reserved.
+#
+# This file is part of cube_helper and is released under the
+# BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+import unittest
+import iris
+import cf_units
+import numpy as np
+from cube_helper.cube_calendar import _date_fields, DateFields
+
+
+class TestCubeCalendar(unittest.TestCase):
+
+    def _assert_fields_match(self, time_coord):
+        dates = time_coord.units.num2date(time_coord.points)
+        fields = _date_fields(time_coord.points, time_coord.units)
+        for field in DateFields._fields:
+            self.assertEqual(list(getattr(fields, field)),
+                             [getattr(date, field) for date in dates])
+
+    def test_date_fields(self):
+        points = np.concatenate([np.arange(0, 4000) * 0.25,
+                                 np.arange(0, 1000) / 3.0])
+        for calendar in ['standard', 'gregorian', 'proleptic_gregorian',
+                         'noleap', '365_day', '360_day', 'all_leap',
+                         '366_day', 'julian']:
+            for units in ['hours since 1970-01-01 00:00:00',
+                          'days since 1850-01-01 12:00:00',
+                          'days since 0001-01-01',
+                          'days since 1582-10-01']:
+                time_coord = iris.coords.AuxCoord(
+                    points, standard_name='time',
+                    units=cf_units.Unit(units, calendar))
+                self._assert_fields_match(time_coord)
+
+    def test_date_fields_shape(self):
+        time_coord = iris.coords.AuxCoord(
+            np.arange(12).reshape(3, 4), standard_name='time',
+            units='days since 2000-01-01')
+        fields = _date_fields(time_coord.points, time_coord.units)
+        self.assertEqual(fields.day.shape, (3, 4))
+        self.assertEqual(fields.day[2, 3], 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# (C) Crown Copyright, Met Office. All rights reserved.
+#
+# This file is part of cube_helper and is released under the
+# BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+import unittest
+import os
+import stat
+import iris
+from iris.tests import stock
+from cube_helper.cube_catalog import Catalog
+from cube_helper.cube_scanner import scan_file
+from cube_helper.cube_loader import load_from_dir
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class TestCubeCatalog(unittest.TestCase):
+
+    def setUp(self):
+        super(TestCubeCatalog, self).setUp()
+        abs_path = os.path.dirname(os.path.abspath(__file__))
+        self.tmp_dir_catalog = abs_path + '/' + 'tmp_dir_catalog/'
+        if not os.path.exists(self.tmp_dir_catalog):
+            os.mkdir(self.tmp_dir_catalog)
+        self.base_cube = stock.realistic_3d()
+        self.temp_1 = 'temp_1_catalog.nc'
+        self.temp_2 = 'temp_2_catalog.nc'
+        iris.save(self.base_cube[0:2], self.tmp_dir_catalog + self.temp_1)
+        iris.save(self.base_cube[2:4], self.tmp_dir_catalog + self.temp_2)
+        self.catalog_file = abs_path + '/' + 'tmp_catalog.json'
+
+    def test_catalog_records(self):
+        path = self.tmp_dir_catalog + self.temp_1
+        catalog = Catalog(self.catalog_file)
+        self.assertEqual(catalog.records(path), scan_file(path))
+        catalog.save()
+        catalog = Catalog(self.catalog_file)
+        with mock.patch('cube_helper.cube_catalog.scan_file') as scan:
+            records = catalog.records(path)
+            self.assertFalse(scan.called)
+        self.assertEqual(records[0].shape, scan_file(path)[0].shape)
+        self.assertEqual(records[0].time_units, scan_file(path)[0].time_units)
+        self.assertEqual(records[0].dim_coords, scan_file(path)[0].dim_coords)
+
+    def test_catalog_rescans_changed_files(self):
+        path = self.tmp_dir_catalog + self.temp_1
+        catalog = Catalog(self.catalog_file)
+        catalog.records(path)
+        catalog.save()
+        iris.save(self.base_cube[0:4], path)
+        catalog = Catalog(self.catalog_file)
+        self.assertEqual(catalog.records(path)[0].shape[0], 4)
+
+    def test_catalog_file_mode(self):
+        umask = os.umask(0o022)
+        try:
+            catalog = Catalog(self.catalog_file)
+            catalog.records(self.tmp_dir_catalog + self.temp_1)
+            catalog.save()
+            self.assertEqual(
+                stat.S_IMODE(os.stat(self.catalog_file).st_mode), 0o644)
+            os.chmod(self.catalog_file, 0o664)
+            catalog = Catalog(self.catalog_file)
+            catalog.records(self.tmp_dir_catalog + self.temp_2)
+            catalog.save()
+            self.assertEqual(
+                stat.S_IMODE(os.stat(self.catalog_file).st_mode), 0o664)
+        finally:
+            os.umask(umask)
+
+    def test_load_from_dir_catalog(self):
+        test_load, test_names = load_from_dir(self.tmp_dir_catalog, '.nc',
+                                              catalog=self.catalog_file)
+        self.assertTrue(os.path.exists(self.catalog_file))
+        with mock.patch('cube_helper.cube_catalog.glob') as glob, \
+                mock.patch('cube_helper.cube_catalog.scan_file') as scan:
+            cached_load, cached_names = load_from_dir(
+                self.tmp_dir_catalog, '.nc', catalog=self.catalog_file)
+            self.assertFalse(glob.glob.called)
+            self.assertFalse(scan.called)
+        self.assertEqual(cached_names, test_names)
+
+    def tearDown(self):
+        super(TestCubeCatalog, self).tearDown()
+        if os.path.exists(self.tmp_dir_catalog + self.temp_1):
+            os.remove(self.tmp_dir_catalog + self.temp_1)
+        if os.path.exists(self.tmp_dir_catalog + self.temp_2):
+            os.remove(self.tmp_dir_catalog + self.temp_2)
+        if os.path.exists(self.catalog_file):
+            os.remove(self.catalog_file)
+        os.removedirs(self.tmp_dir_catalog)
+
+
+if __name__ == '__main__':
+    unittest.main()
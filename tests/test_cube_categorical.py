@@ -0,0 +1,133 @@
+# (C) Crown Copyright, Met Office. All rights reserved.
+#
+# This file is part of cube_helper and is released under the
+# BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+import unittest
+import warnings
+import numpy as np
+import cf_units
+import iris
+import iris.coord_categorisation
+from iris.coords import DimCoord
+from iris.cube import Cube
+from cube_helper.cube_calendar import _date_fields
+from cube_helper.cube_categorical import (add_categorised,
+                                          clear_categorical_cache,
+                                          _LRUCache)
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class TestCubeCategorical(unittest.TestCase):
+
+    def setUp(self):
+        super(TestCubeCategorical, self).setUp()
+        self.categorisations = {
+            'year': iris.coord_categorisation.add_year,
+            'month_number': iris.coord_categorisation.add_month_number,
+            'month_fullname': iris.coord_categorisation.add_month_fullname,
+            'month': iris.coord_categorisation.add_month,
+            'day_of_month': iris.coord_categorisation.add_day_of_month,
+            'day_of_year': iris.coord_categorisation.add_day_of_year,
+            'weekday_number': iris.coord_categorisation.add_weekday_number,
+            'weekday_fullname':
+                iris.coord_categorisation.add_weekday_fullname,
+            'weekday': iris.coord_categorisation.add_weekday,
+            'hour': iris.coord_categorisation.add_hour}
+        self.seasonal = {
+            'season': iris.coord_categorisation.add_season,
+            'season_number': iris.coord_categorisation.add_season_number,
+            'season_year': iris.coord_categorisation.add_season_year}
+
+    def _time_cube(self, points, units, calendar):
+        cube = Cube(np.zeros(len(points)))
+        cube.add_dim_coord(DimCoord(points,
+                                    standard_name='time',
+                                    units=cf_units.Unit(units, calendar),
+                                    attributes={'comment': 'test'}), 0)
+        return cube
+
+    def _assert_matches_iris(self, cube, name, iris_function, **kwargs):
+        iris_cube = cube.copy()
+        test_cube = cube.copy()
+        iris_function(iris_cube, 'time', **kwargs)
+        add_categorised(test_cube, 'time', name, **kwargs)
+        self.assertEqual(test_cube.coord(name), iris_cube.coord(name))
+        self.assertEqual(test_cube.coord(name).dtype,
+                         iris_cube.coord(name).dtype)
+
+    def test_add_categorised(self):
+        time_axes = [('hours since 1850-01-01', np.arange(0, 24 * 1500, 7.)),
+                     ('days since 1970-01-01',
+                      np.arange(-20000, 20000, 11, dtype=np.int32))]
+        for calendar in ['gregorian', 'noleap', '360_day', 'all_leap']:
+            for units, points in time_axes:
+                cube = self._time_cube(points, units, calendar)
+                for name, iris_function in self.categorisations.items():
+                    self._assert_matches_iris(cube, name, iris_function)
+                for name, iris_function in self.seasonal.items():
+                    for seasons in [('djf', 'mam', 'jja', 'son'),
+                                    ('ndjfma', 'mjjaso')]:
+                        self._assert_matches_iris(cube, name, iris_function,
+                                                  seasons=seasons)
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    self._assert_matches_iris(
+                        cube, 'season_membership',
+                        iris.coord_categorisation.add_season_membership,
+                        season='jja')
+
+    def test_add_categorised_julian_dates(self):
+        cube = self._time_cube(np.arange(0, 366 * 200, 13.5),
+                               'days since 1500-01-01', 'standard')
+        for name in ['day_of_year', 'weekday_number', 'year']:
+            self._assert_matches_iris(cube, name,
+                                      self.categorisations[name])
+
+    def test_add_categorised_cache(self):
+        clear_categorical_cache()
+        cubes = [self._time_cube(np.arange(100.), 'days since 2000-01-01',
+                                 'noleap') for _ in range(3)]
+        with mock.patch('cube_helper.cube_categorical._date_fields',
+                        wraps=_date_fields) as date_fields:
+            for cube in cubes:
+                add_categorised(cube, 'time', 'season_year')
+                add_categorised(cube, 'time', 'month')
+            self.assertEqual(date_fields.call_count, 1)
+            add_categorised(cubes[0], 'time', 'season_number',
+                            seasons=('ndjfma', 'mjjaso'))
+            self.assertEqual(date_fields.call_count, 1)
+            cube = self._time_cube(np.arange(1., 101.),
+                                   'days since 2000-01-01', 'noleap')
+            add_categorised(cube, 'time', 'month')
+            self.assertEqual(date_fields.call_count, 2)
+        cubes[0].coord('month').points[0] = 'Dec'
+        self.assertEqual(cubes[1].coord('month').points[0], 'Jan')
+        self.assertEqual(cubes[2].coord('season_year'),
+                         cubes[1].coord('season_year'))
+
+    def test_lru_cache(self):
+        cache = _LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_add_categorised_errors(self):
+        cube = self._time_cube(np.arange(10.), 'days since 2000-01-01',
+                               'gregorian')
+        add_categorised(cube, 'time', 'year')
+        self.assertRaises(ValueError, add_categorised, cube, 'time', 'year')
+        self.assertRaises(ValueError, add_categorised, cube, 'time',
+                          'season', seasons=('djf', 'mam', 'jja'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,12 +4,14 @@
 # BSD 3-Clause license.
 # See LICENSE in the root of the repository for full licensing details.
 import cube_helper as ch
+from cube_helper.cube_equaliser import _cast_in_place, _consistent
 from common import _generate_ocean_cube, _redirect_stdout
 import unittest
 import cf_units
 from glob import glob
 import os
 import iris
+import numpy as np
 from iris.tests import stock
 import platform
 if float(platform.python_version()[0:3]) <= 2.7:
@@ -27,6 +29,7 @@ class TestCubeEqualiser(unittest.TestCase):
         self.tmp_dir_aux = abs_path + '/' + 'tmp_dir_aux/'
         self.tmp_dir_attr = abs_path + '/' + 'tmp_dir_attr/'
         self.tmp_dir_time = abs_path + '/' + 'tmp_dir_time/'
+        self.plan_file = abs_path + '/' + 'tmp_plan.json'
         if not os.path.exists(self.tmp_dir):
             os.mkdir(self.tmp_dir)
         if not os.path.exists(self.tmp_dir_attr):
@@ -97,6 +100,21 @@ class TestCubeEqualiser(unittest.TestCase):
         for cubes in test_load:
             self.assertEqual(cubes.attributes, test_load[0].attributes)
 
+    def test_equalise_attributes_arrays(self):
+        test_load = [stock.realistic_3d() for _ in range(3)]
+        for cube in test_load:
+            cube.attributes['common_array'] = np.arange(4)
+            cube.attributes['varying'] = 'a'
+        test_load[1].attributes['uncommon_array'] = np.arange(4)
+        test_load[2].attributes['uncommon_array'] = np.arange(4) + 1
+        test_load[2].attributes['varying'] = 'b'
+        test_load = ch.equalise_attributes(test_load)
+        for cube in test_load:
+            self.assertEqual(sorted(cube.attributes.keys()),
+                             ['common_array', 'source'])
+            np.testing.assert_array_equal(cube.attributes['common_array'],
+                                          np.arange(4))
+
     def test_equalise_time_units(self):
         glob_path = self.tmp_dir_time + '*.nc'
         filepaths = glob(glob_path)
@@ -112,6 +130,53 @@ class TestCubeEqualiser(unittest.TestCase):
                     self.assertEqual(test_origin,
                                      time_coords.units.origin)
 
+    def test_equalise_time_units_matches_iris(self):
+        glob_path = self.tmp_dir_time + '*.nc'
+        filepaths = sorted(glob(glob_path))
+        for dtype in [np.float64, np.float32, np.int32]:
+            test_load = [iris.load_cube(cube) for cube in filepaths]
+            for cube in test_load:
+                time_coord = cube.coord('time')
+                time_coord.guess_bounds()
+                time_coord.points = time_coord.points.astype(dtype)
+                time_coord.bounds = time_coord.bounds.astype(dtype)
+            iris_load = [cube.copy() for cube in test_load]
+            iris.util.unify_time_units(iris_load)
+            test_load = ch.equalise_time_units(test_load)
+            for cube, iris_cube in zip(test_load, iris_load):
+                for coord in cube.coords():
+                    iris_coord = iris_cube.coord(coord.name())
+                    self.assertEqual(coord.units, iris_coord.units)
+                    self.assertEqual(coord.dtype, iris_coord.dtype)
+                    np.testing.assert_allclose(coord.points,
+                                               iris_coord.points)
+                self.assertEqual(cube.coord('time').bounds.dtype,
+                                 iris_cube.coord('time').bounds.dtype)
+                np.testing.assert_allclose(cube.coord('time').bounds,
+                                           iris_cube.coord('time').bounds)
+
+    def test_equalise_time_units_lazy(self):
+        glob_path = self.tmp_dir_time + '*.nc'
+        filepaths = sorted(glob(glob_path))
+        test_load = [iris.load_cube(cube) for cube in filepaths]
+        for cube in test_load:
+            time_coord = cube.coord('time')
+            cube.remove_coord(time_coord)
+            time_coord = iris.coords.AuxCoord.from_coord(time_coord)
+            time_coord.points = time_coord.lazy_points()
+            cube.add_aux_coord(time_coord, 0)
+        test_load = ch.equalise_time_units(test_load, lazy=True)
+        expected = [0, 6, 12, 18, 24, 30, 36]
+        points = []
+        for cube in test_load:
+            time_coord = cube.coord('time')
+            self.assertTrue(time_coord.has_lazy_points())
+            self.assertEqual(time_coord.units, test_load[0].coord(
+                'time').units)
+            points.extend(time_coord.points - test_load[0].coord(
+                'time').points[0])
+        np.testing.assert_allclose(points, expected)
+
     def test_remove_attributes(self):
         glob_path = self.tmp_dir + '*.nc'
         filepaths = glob(glob_path)
@@ -139,6 +204,46 @@ class TestCubeEqualiser(unittest.TestCase):
         for cube in test_load:
             self.assertEqual(cube.dtype, 'int64')
 
+    def test_equalise_data_type_lazy(self):
+        glob_path = self.tmp_dir + '*.nc'
+        filepaths = glob(glob_path)
+        test_load = [iris.load_cube(cube) for cube in filepaths]
+        for cube in test_load:
+            cube.data = cube.lazy_data()
+        test_load = ch.equalise_data_type(test_load, 'float64')
+        for cube in test_load:
+            self.assertTrue(cube.has_lazy_data())
+            self.assertEqual(cube.dtype, 'float64')
+
+    def test_equalise_data_type_modes(self):
+        test_cubes = [stock.realistic_3d() for _ in range(3)]
+        test_cubes[1].data = test_cubes[1].data.astype('float32')
+        test_cubes[2].data = np.arange(test_cubes[2].data.size,
+                                       dtype='int16').reshape(
+            test_cubes[2].shape)
+        expected = [cube.data.astype('float64') for cube in test_cubes]
+        test_cubes = ch.equalise_data_type(test_cubes, 'common')
+        for cube, data in zip(test_cubes, expected):
+            self.assertEqual(cube.dtype, 'float64')
+            np.testing.assert_array_equal(cube.data, data)
+        self.assertRaises(ValueError, ch.equalise_data_type, test_cubes,
+                          'int32', casting='same_kind')
+        self.assertRaises(ValueError, ch.equalise_data_type, test_cubes,
+                          'bananas')
+        data = test_cubes[0].data
+        test_cubes = ch.equalise_data_type(test_cubes, 'float32',
+                                           in_place=True)
+        self.assertTrue(np.shares_memory(test_cubes[0].data, data))
+        for cube, expected_data in zip(test_cubes, expected):
+            self.assertEqual(cube.dtype, 'float32')
+            np.testing.assert_array_equal(cube.data,
+                                          expected_data.astype('float32'))
+        data = np.ma.masked_less(np.arange(6.).reshape(2, 3), 2)
+        cast = _cast_in_place(data, np.dtype('int32'))
+        self.assertEqual(cast.dtype, 'int32')
+        np.testing.assert_array_equal(cast.mask, data.mask)
+        np.testing.assert_array_equal(cast.data, [[0, 1, 2], [3, 4, 5]])
+
     def test_equalise_dim_coords(self):
         glob_path = self.tmp_dir + '*.nc'
         filepaths = glob(glob_path)
@@ -148,6 +253,21 @@ class TestCubeEqualiser(unittest.TestCase):
             self.assertEqual(cube.dim_coords[0].name(), 'time')
             self.assertEqual(cube.dim_coords[1].name(), 'grid_latitude')
 
+    def test_equalise_dim_coords_values(self):
+        test_load = [stock.realistic_3d() for _ in range(3)]
+        latitude = test_load[1].coord('grid_latitude')
+        latitude.points = latitude.points + 1e-12
+        test_load[2].coord('grid_longitude').guess_bounds()
+        out = IO()
+        with _redirect_stdout(out):
+            ch.equalise_dim_coords(test_load, comp_only=True)
+        output = out.getvalue().strip()
+        expected_output = "cube dim coordinates differ: " \
+                          "\n\n\tgrid_latitude coords points " \
+                          "inconsistent\n\n\tgrid_longitude coords " \
+                          "bounds inconsistent"
+        self.assertEqual(output, expected_output)
+
     def test_equalise_dim_coords_ocean(self):
         test_load = _generate_ocean_cube()
         test_load[10].coord('time').var_name = 'bananas'
@@ -168,17 +288,59 @@ class TestCubeEqualiser(unittest.TestCase):
             coords_list = [c.name() for c in cube.coords()]
             self.assertIn('height', coords_list)
 
+    def test_equalise_aux_coords_donor(self):
+        test_load = [stock.realistic_3d() for _ in range(4)]
+        height_coord = iris.coords.AuxCoord(2, standard_name='height',
+                                            units='m')
+        test_load[2].add_aux_coord(height_coord)
+        test_load[3].add_aux_coord(iris.coords.AuxCoord(
+            1, long_name='extra'))
+        out = IO()
+        with _redirect_stdout(out):
+            ch.equalise_aux_coords(test_load, comp_only=True)
+        output = out.getvalue()
+        self.assertIn('height', output)
+        self.assertIn('extra', output)
+        test_load = ch.equalise_aux_coords(test_load)
+        for cube in test_load:
+            self.assertEqual(cube.coord('height'), height_coord)
+        self.assertFalse(test_load[0].coords('extra'))
+        test_load[0].coord('height').points = [3]
+        self.assertEqual(test_load[1].coord('height').points, [2])
+
     def test_compare_cubes(self):
         glob_path = self.tmp_dir_aux + '*.nc'
-        filepaths = glob(glob_path)
+        filepaths = sorted(glob(glob_path))
         test_load = [iris.load_cube(cube) for cube in filepaths]
         out = IO()
         with _redirect_stdout(out):
-            ch.compare_cubes(test_load)
+            groups = ch.compare_cubes(test_load, filepaths)
         output = out.getvalue().strip()
-        expected_output = "cube aux coordinates differ: " + \
-                          "\n\n\theight coords inconsistent"
+        self.assertEqual(groups, [[0, 2], [1]])
+        expected_output = "cubes fall into 2 groups of matching " + \
+                          "metadata:\n\tgroup 1: {}, {}\n\tgroup 2: {}" \
+                          "\n\n\ncube aux coordinates differ: " \
+                          "\n\n\theight coords inconsistent".format(
+                              filepaths[0], filepaths[2], filepaths[1])
         self.assertEqual(output, expected_output)
+        out = IO()
+        with _redirect_stdout(out):
+            groups = ch.compare_cubes([test_load[0], test_load[2]])
+        self.assertEqual(groups, [[0, 1]])
+        self.assertEqual(out.getvalue().strip(), "")
+
+    def test_compare_cubes_attributes(self):
+        filepaths = sorted(glob(self.tmp_dir_attr + '*.nc'))
+        test_load = [iris.load_cube(cube) for cube in filepaths]
+        out = IO()
+        with _redirect_stdout(out):
+            groups = ch.compare_cubes(test_load, filepaths)
+        output = out.getvalue()
+        self.assertEqual(groups, [[0, 1, 2]])
+        self.assertNotIn("groups of matching metadata", output)
+        self.assertIn("cube attributes differ", output)
+        for key in ['history', 'creation_date', 'tracking_id']:
+            self.assertIn(key, output)
 
     def test_compare_cubes_incompatible(self):
         test_case_a = stock.simple_2d()
@@ -197,6 +359,31 @@ class TestCubeEqualiser(unittest.TestCase):
         expected_output = ""
         self.assertEqual(output, expected_output)
 
+    def test_examine_time_extents(self):
+        base_cube = stock.realistic_3d()
+        test_cubes = [base_cube[4:], base_cube[0:2], base_cube[2:4]]
+        report = ch.examine_time_extents(test_cubes)
+        self.assertEqual((report.overlaps, report.gaps, report.duplicates),
+                         ([], [], []))
+        test_cubes = [base_cube[0:2], base_cube[4:], base_cube[1:3],
+                      base_cube[0:2]]
+        report = ch.examine_time_extents(test_cubes, ['a', 'b', 'c', 'd'])
+        self.assertEqual(report.duplicates, [(0, 3)])
+        self.assertEqual(sorted(report.overlaps), [(0, 2), (3, 2)])
+        self.assertEqual(report.gaps, [(2, 1)])
+        self.assertEqual(report.cube_files, ['a', 'b', 'c', 'd'])
+        for cube in test_cubes:
+            cube.coord('time').guess_bounds()
+        report = ch.examine_time_extents(test_cubes[:2])
+        self.assertEqual(report.gaps, [(0, 1)])
+        self.assertEqual(report.overlaps, [])
+        test_cubes = [base_cube[0:2], base_cube[2:4]]
+        for cube in test_cubes:
+            cube.coord('time').guess_bounds()
+        report = ch.examine_time_extents(test_cubes)
+        self.assertEqual((report.overlaps, report.gaps, report.duplicates),
+                         ([], [], []))
+
     def test_equalise_all(self):
         glob_path = self.tmp_dir_attr + '*.nc'
         filepaths = glob(glob_path)
@@ -207,6 +394,82 @@ class TestCubeEqualiser(unittest.TestCase):
         self.assertNotIn('history', test_attr)
         self.assertNotIn('tracking_id', test_attr)
 
+    def test_compare_and_equalise(self):
+        for tmp_dir in [self.tmp_dir_aux, self.tmp_dir_attr,
+                        self.tmp_dir_time]:
+            filepaths = sorted(glob(tmp_dir + '*.nc'))
+            expected_cubes = [iris.load_cube(path) for path in filepaths]
+            test_cubes = [iris.load_cube(path) for path in filepaths]
+            out = IO()
+            with _redirect_stdout(out):
+                ch.compare_cubes(expected_cubes, filepaths)
+                ch.equalise_all(expected_cubes)
+            expected_output = out.getvalue()
+            out = IO()
+            with _redirect_stdout(out):
+                ch.compare_and_equalise(test_cubes, filepaths)
+            self.assertEqual(out.getvalue(), expected_output)
+            self.assertEqual(test_cubes, expected_cubes)
+            for test_cube, expected_cube in zip(test_cubes, expected_cubes):
+                self.assertEqual(test_cube.coord('time').units,
+                                 expected_cube.coord('time').units)
+        self.assertRaises(OSError,
+                          ch.compare_and_equalise,
+                          [stock.simple_2d(), stock.simple_3d()])
+
+    def test_plan_equalisation(self):
+        for tmp_dir in [self.tmp_dir_aux, self.tmp_dir_attr,
+                        self.tmp_dir_time]:
+            filepaths = sorted(glob(tmp_dir + '*.nc'))
+            original_cubes = [iris.load_cube(path) for path in filepaths]
+            test_cubes = [iris.load_cube(path) for path in filepaths]
+            plan = ch.plan_equalisation(test_cubes)
+            self.assertEqual(test_cubes, original_cubes)
+            expected_cubes = ch.equalise_all(original_cubes)
+            umask = os.umask(0o022)
+            try:
+                plan.save(self.plan_file)
+            finally:
+                os.umask(umask)
+            self.assertEqual(os.stat(self.plan_file).st_mode & 0o777, 0o644)
+            saved_plan = ch.EqualisationPlan.load(self.plan_file)
+            self.assertEqual(saved_plan, plan)
+            saved_plan.apply(test_cubes)
+            self.assertEqual(test_cubes, expected_cubes)
+            for test_cube, expected_cube in zip(test_cubes, expected_cubes):
+                self.assertEqual(test_cube.coord('time').units,
+                                 expected_cube.coord('time').units)
+        replay_cubes = [iris.load_cube(path) for path in
+                        sorted(glob(self.tmp_dir_aux + '*.nc'))]
+        plan = ch.plan_equalisation(replay_cubes[:2])
+        self.assertEqual(plan.height.points, [2])
+        plan.apply(replay_cubes)
+        for cube in replay_cubes:
+            self.assertEqual(cube.coord('height').points, [2])
+        self.assertRaises(ValueError, ch.EqualisationPlan.from_dict,
+                          {'version': None})
+
+    def test_consistent(self):
+        test_load = [iris.load_cube(path)
+                     for path in sorted(glob(self.tmp_dir + '*.nc'))]
+        self.assertTrue(_consistent(test_load))
+        expected_cubes = [cube.copy() for cube in test_load]
+        self.assertEqual(ch.equalise_all(expected_cubes), test_load)
+        for tmp_dir in [self.tmp_dir_aux, self.tmp_dir_attr,
+                        self.tmp_dir_time]:
+            test_load = [iris.load_cube(path)
+                         for path in sorted(glob(tmp_dir + '*.nc'))]
+            self.assertFalse(_consistent(test_load))
+        test_load = [iris.load_cube(path)
+                     for path in sorted(glob(self.tmp_dir + '*.nc'))]
+        for cube in test_load:
+            reference_time = cube.coord('time').copy()
+            reference_time.rename('forecast_reference_time')
+            reference_time.convert_units(
+                cf_units.Unit('days since 1970-01-01', 'gregorian'))
+            cube.add_aux_coord(reference_time, 0)
+        self.assertFalse(_consistent(test_load))
+
     def tearDown(self):
         super(TestCubeEqualiser, self).tearDown()
         if os.path.exists(self.tmp_dir + self.temp_1):
@@ -233,6 +496,8 @@ class TestCubeEqualiser(unittest.TestCase):
             os.remove(self.tmp_dir_attr + self.temp_3_attr)
         if os.path.exists(self.tmp_dir_time + self.temp_3_time):
             os.remove(self.tmp_dir_time + self.temp_3_time)
+        if os.path.exists(self.plan_file):
+            os.remove(self.plan_file)
         os.removedirs(self.tmp_dir)
         os.removedirs(self.tmp_dir_aux)
         os.removedirs(self.tmp_dir_attr)
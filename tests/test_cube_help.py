@@ -8,17 +8,29 @@ import unittest
 from iris.tests import stock
 import iris
 import cube_helper as ch
+from cube_helper.cube_help import _check_lazy, _concatenate_loaded
 from glob import glob
 import os
 import cf_units
+import numpy as np
 import common
 import platform
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 if float(platform.python_version()[0:3]) <= 2.8:
     from io import BytesIO as IO
 else:
     from io import StringIO as IO
 
 
+def _realise_all(cubes, cube_files=None, plan=None):
+    for cube in cubes:
+        cube.data
+    return cubes
+
+
 class TestCubeHelp(unittest.TestCase):
 
     def setUp(self):
@@ -111,11 +123,16 @@ class TestCubeHelp(unittest.TestCase):
                          "hours since 1970-01-01 00:00:00")
         self.assertEqual(test_case_a.dim_coords[0].units.calendar,
                          "gregorian")
-        expected_output = "cube aux coordinates differ: " \
+        expected_output = "cubes fall into 3 groups of matching " \
+                          "metadata:\n\tgroup 1: {}\n\tgroup 2: {}" \
+                          "\n\tgroup 3: {}" \
                           "\n\ncube time coordinates differ: " \
                           "\n\n\ttime start date inconsistent" \
                           "\n\nNew time origin set to hours since " \
-                          "1970-01-01 00:00:00"
+                          "1970-01-01 00:00:00".format(
+                              self.tmp_dir_time + self.temp_1_time,
+                              self.tmp_dir_time + self.temp_2_time,
+                              self.tmp_dir_time + self.temp_3_time)
         self.assertEqual(output, expected_output)
         out = IO()
         with common._redirect_stdout(out):
@@ -163,13 +180,137 @@ class TestCubeHelp(unittest.TestCase):
                          "hours since 1970-01-01 00:00:00")
         self.assertEqual(test_case_switch.dim_coords[0].units.calendar,
                          "gregorian")
-        expected_output = "cube aux coordinates differ: " \
+        expected_output = "cubes fall into 3 groups of matching " \
+                          "metadata:\n\tgroup 1: {}\n\tgroup 2: {}" \
+                          "\n\tgroup 3: {}" \
                           "\n\ncube time coordinates differ: " \
                           "\n\n\ttime start date inconsistent" \
                           "\n\nNew time origin set to hours since " \
-                          "1970-01-01 00:00:00"
+                          "1970-01-01 00:00:00".format(
+                              self.tmp_dir_time + self.temp_1_time,
+                              self.tmp_dir_time + self.temp_2_time,
+                              self.tmp_dir_time + self.temp_3_time)
         self.assertEqual(output, expected_output)
 
+    def test_load_lazy(self):
+        glob_path = self.tmp_dir_ocean + '*.nc'
+        filepaths = glob(glob_path)
+        test_case_a = ch.load(filepaths, lazy=True)
+        self.assertTrue(test_case_a.has_lazy_data())
+        test_case_b = ch.load(self.tmp_dir_ocean, lazy=True)
+        self.assertTrue(test_case_b.has_lazy_data())
+        with mock.patch('cube_helper.cube_help._equalise_loaded',
+                        side_effect=_realise_all):
+            self.assertRaises(RuntimeError, ch.load, filepaths, lazy=True)
+
+    def test_load_plan(self):
+        directory = self.tmp_dir_time
+        plan_file = os.path.dirname(os.path.abspath(__file__)) + \
+            '/tmp_plan.json'
+        try:
+            test_case_a = ch.load(directory, plan=plan_file)
+            self.assertTrue(os.path.exists(plan_file))
+            with mock.patch('cube_helper.cube_help._compare_and_plan') \
+                    as compare:
+                test_case_b = ch.load(directory, plan=plan_file)
+                self.assertFalse(compare.called)
+            test_case_c = ch.load(directory,
+                                  plan=ch.EqualisationPlan.load(plan_file))
+        finally:
+            if os.path.exists(plan_file):
+                os.remove(plan_file)
+        self.assertEqual(test_case_b, test_case_a)
+        self.assertEqual(test_case_c, test_case_a)
+
+    def test_load_int_time(self):
+        tmp_dir_int = os.path.dirname(os.path.abspath(__file__)) + \
+            '/tmp_dir_int/'
+        plan_file = tmp_dir_int + 'plan.json'
+        if not os.path.exists(tmp_dir_int):
+            os.mkdir(tmp_dir_int)
+        try:
+            for number, (start, origin) in enumerate(
+                    [(0, '2000-01-01'), (10, '2000-01-01'),
+                     (16, '2000-01-05')]):
+                cube = iris.cube.Cube(np.zeros((10, 3), dtype=np.float32),
+                                      standard_name='air_temperature',
+                                      units='K')
+                cube.add_dim_coord(iris.coords.DimCoord(
+                    np.arange(start, start + 10, dtype=np.int32),
+                    standard_name='time',
+                    units=cf_units.Unit('days since ' + origin,
+                                        'standard')), 0)
+                cube.add_dim_coord(iris.coords.DimCoord(
+                    np.arange(3.), long_name='level'), 1)
+                iris.save(cube, tmp_dir_int + 'int_{}.nc'.format(number))
+            test_case = ch.load(tmp_dir_int)
+            self.assertEqual(test_case.shape, (30, 3))
+            self.assertEqual(test_case.coord('time').dtype, np.float64)
+            np.testing.assert_array_equal(test_case.coord('time').points,
+                                          np.arange(30))
+            for _ in range(2):
+                self.assertEqual(ch.load(tmp_dir_int, plan=plan_file),
+                                 test_case)
+        finally:
+            for filename in glob(tmp_dir_int + '*'):
+                os.remove(filename)
+            os.rmdir(tmp_dir_int)
+
+    def test_load_consistent(self):
+        directory = self.tmp_dir_ocean
+        out = IO()
+        with common._redirect_stdout(out), \
+                mock.patch('cube_helper.cube_help.compare_and_equalise') \
+                as compare:
+            test_case = ch.load(directory)
+            self.assertFalse(compare.called)
+        self.assertIsInstance(test_case, iris.cube.Cube)
+        self.assertEqual(out.getvalue().strip(),
+                         "Cube metadata matches, equalisation skipped")
+
+    def test_load_chunks(self):
+        directory = self.tmp_dir_ocean
+        loaded_cubes, _ = ch.load_from_dir(directory, '.nc',
+                                           chunks={'time': 2})
+        lazy_cubes = [cube for cube in loaded_cubes if cube.has_lazy_data()]
+        self.assertTrue(lazy_cubes)
+        for cube in lazy_cubes:
+            self.assertEqual(max(cube.lazy_data().chunks[0]), 2)
+        loaded_cubes, _ = ch.load_from_dir(directory, '.nc', chunks=0.001)
+        for cube in loaded_cubes:
+            if cube.has_lazy_data():
+                self.assertGreater(cube.lazy_data().npartitions, 1)
+        test_case = ch.load(directory, time_chunks=100)
+        self.assertEqual(set(test_case.lazy_data().chunks[0][:-1]), {100})
+        self.assertEqual(test_case.lazy_data().chunks[1:],
+                         ((test_case.shape[1],), (test_case.shape[2],)))
+
+    def test_check_lazy(self):
+        test_load = [iris.load_cube(cube)
+                     for cube in glob(self.tmp_dir_time + '*.nc')]
+        for cube in test_load:
+            cube.data = cube.lazy_data()
+        _check_lazy(test_load, 'loading')
+        test_load[1].data
+        self.assertRaises(RuntimeError, _check_lazy, test_load, 'loading')
+
+    def test_load_overlapping(self):
+        filepaths = sorted(glob(self.tmp_dir_time + '*.nc'))
+        with mock.patch('iris.cube.CubeList.concatenate_cube') as concat:
+            self.assertRaises(iris.exceptions.ConcatenateError, ch.load,
+                              filepaths + filepaths[:1])
+            self.assertFalse(concat.called)
+
+    def test_concatenate_tiles(self):
+        base_cube = stock.realistic_3d()
+        tiles = [base_cube[:, :4], base_cube[:, 4:]]
+        result = _concatenate_loaded(tiles, ['tile_1.nc', 'tile_2.nc'])
+        self.assertEqual(result.shape, (7, 9, 11))
+        self.assertEqual(result, base_cube)
+        self.assertRaises(iris.exceptions.ConcatenateError,
+                          _concatenate_loaded, [base_cube, base_cube],
+                          ['tile_1.nc', 'tile_1.nc'])
+
     def test_load_ocean(self):
         glob_path = self.tmp_dir_ocean + '*.nc'
         filepaths = glob(glob_path)
@@ -207,6 +348,69 @@ class TestCubeHelp(unittest.TestCase):
         self.assertEqual(test_cube_a.coord('season_year').points[0],
                          1970)
 
+    def test_aggregate_categorical_stream(self):
+        directory = self.tmp_dir_ocean
+        expected_cube = ch.load(directory)
+        expected_cube.data
+        ch.add_categorical(expected_cube, 'annual_seasonal_mean')
+        loaded_cubes, _ = ch.load_from_dir(directory, '.nc')
+        for agg_method in [iris.analysis.MEAN, iris.analysis.STD_DEV,
+                           iris.analysis.MAX]:
+            expected = expected_cube.aggregated_by(
+                ['clim_season', 'season_year'], agg_method)
+            test_case_a = ch.aggregate_categorical(directory,
+                                                   'annual_seasonal_mean',
+                                                   agg_method=agg_method)
+            test_case_b = ch.aggregate_categorical(
+                [cube.copy() for cube in loaded_cubes],
+                'annual_seasonal_mean', agg_method=agg_method)
+            for test_case in [test_case_a, test_case_b]:
+                self.assertEqual(test_case.metadata, expected.metadata)
+                self.assertEqual(test_case.coords(), expected.coords())
+                self.assertEqual(test_case.dtype, expected.dtype)
+                np.testing.assert_allclose(test_case.data, expected.data)
+        # The DJF season spanning the first two files.
+        self.assertEqual(test_case_a.coord('season_year').points[8], 1972)
+        self.assertRaises(ValueError, ch.aggregate_categorical, directory,
+                          'year', agg_method=iris.analysis.MEDIAN)
+
+    def test_aggregate_categorical_agg_methods(self):
+        agg_methods = [iris.analysis.MEAN, iris.analysis.MAX,
+                       iris.analysis.MIN, iris.analysis.STD_DEV]
+        test_cube = common._generate_extended_cube()
+        test_cases = ch.aggregate_categorical(test_cube.copy(),
+                                              'annual_seasonal_mean',
+                                              agg_method=agg_methods)
+        self.assertIsInstance(test_cases, iris.cube.CubeList)
+        self.assertEqual(len(test_cases), len(agg_methods))
+        for test_case, agg_method in zip(test_cases, agg_methods):
+            expected = ch.aggregate_categorical(test_cube.copy(),
+                                                'annual_seasonal_mean',
+                                                agg_method=agg_method)
+            self.assertEqual(test_case.metadata, expected.metadata)
+            self.assertEqual(test_case.coords(), expected.coords())
+            np.testing.assert_allclose(test_case.data, expected.data)
+        # Realised data is aggregated exactly as by each aggregator alone.
+        test_cube.data = (280 + np.random.RandomState(0).rand(
+            *test_cube.shape)).astype(np.float32)
+        test_cases = ch.aggregate_categorical(test_cube.copy(),
+                                              'annual_seasonal_mean',
+                                              agg_method=agg_methods)
+        for test_case, agg_method in zip(test_cases, agg_methods):
+            expected = ch.aggregate_categorical(test_cube.copy(),
+                                                'annual_seasonal_mean',
+                                                agg_method=agg_method)
+            self.assertEqual(test_case, expected)
+            self.assertEqual(test_case.dtype, expected.dtype)
+            np.testing.assert_array_equal(test_case.data, expected.data)
+        test_cases = ch.aggregate_categorical(
+            test_cube.copy(), 'year',
+            agg_method=[iris.analysis.MEAN, iris.analysis.MEDIAN])
+        self.assertEqual(test_cases[1],
+                         ch.aggregate_categorical(
+                             test_cube.copy(), 'year',
+                             agg_method=iris.analysis.MEDIAN))
+
     def test_aggregate_categorical_weekday(self):
         test_cube_a = common._generate_extended_cube()
         test_cube_a = ch.aggregate_categorical(test_cube_a,
@@ -8,16 +8,32 @@ import os
 import iris
 from iris.tests import stock
 import cf_units
+import numpy as np
 from datetime import datetime
 from glob import glob
+import types
+import dask
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from cube_helper import cube_loader
+from cube_helper.cube_scanner import scan_file
 from cube_helper.cube_loader import (load_from_dir,
                                      load_from_filelist,
+                                     iter_cubes,
                                      _parse_directory,
                                      _sort_by_date,
                                      file_sort_by_earliest_date,
                                      sort_by_earliest_date,
                                      _constraint_compatible,
-                                     _fix_partial_datetime)
+                                     _fix_partial_datetime,
+                                     _filename_time_span,
+                                     _prune_paths,
+                                     _needs_partial_datetime_fix,
+                                     _cell_matches,
+                                     _PartialDateTimeConstraint,
+                                     _partial_datetime_mask)
 
 
 class TestCubeLoader(unittest.TestCase):
@@ -82,6 +98,103 @@ class TestCubeLoader(unittest.TestCase):
             self.assertIsInstance(name, str)
             self.assertTrue(os.path.exists(name))
 
+    def test_load_from_dir_sorted_pairs(self):
+        test_load, test_names = load_from_dir(self.tmp_dir_time, '.nc')
+        self.assertEqual(test_names,
+                         [self.tmp_dir_time + self.temp_1_time,
+                          self.tmp_dir_time + self.temp_2_time,
+                          self.tmp_dir_time + self.temp_3_time])
+        for cube, name in zip(test_load, test_names):
+            self.assertEqual(cube.coord('time').units,
+                             iris.load_cube(name).coord('time').units)
+
+    def test_load_from_dir_workers(self):
+        serial_load, serial_names = load_from_dir(self.tmp_dir_time, '.nc')
+        for executor in ['thread', 'process']:
+            test_load, test_names = load_from_dir(self.tmp_dir_time, '.nc',
+                                                  workers=2,
+                                                  executor=executor)
+            self.assertEqual(test_names, serial_names)
+            for cube, serial_cube in zip(test_load, serial_load):
+                self.assertEqual(cube, serial_cube)
+        self.assertRaises(ValueError, load_from_dir, self.tmp_dir_time,
+                          '.nc', workers=2, executor='bananas')
+
+    def test_load_from_dir_thread_chunks(self):
+        default_size = dask.config.get('array.chunk-size')
+        chunk_sizes = []
+
+        def load_path(path, constraint=None, chunks=None):
+            chunk_sizes.append(dask.config.get('array.chunk-size'))
+            return _load_path(path, constraint, chunks)
+
+        _load_path = cube_loader._load_path
+        with mock.patch('cube_helper.cube_loader._load_path',
+                        side_effect=load_path):
+            load_from_dir(self.tmp_dir_time, '.nc', workers=2,
+                          executor='thread', chunks=5)
+        self.assertEqual(chunk_sizes, ['5MB'] * 3)
+        self.assertEqual(dask.config.get('array.chunk-size'), default_size)
+
+    def test_iter_cubes(self):
+        test_iter = iter_cubes(self.tmp_dir_time)
+        self.assertIsInstance(test_iter, types.GeneratorType)
+        test_pairs = list(test_iter)
+        test_load, test_names = load_from_dir(self.tmp_dir_time, '.nc')
+        self.assertEqual([path for path, _ in test_pairs], test_names)
+        for (_, cube), loaded_cube in zip(test_pairs, test_load):
+            self.assertEqual(cube, loaded_cube)
+        reversed_names = list(reversed(test_names))
+        self.assertEqual([path for path, _ in iter_cubes(reversed_names)],
+                         test_names)
+        constraint = iris.Constraint(
+            time=iris.time.PartialDateTime(day=22))
+        self.assertEqual([path for path, _ in
+                          iter_cubes(self.tmp_dir_time,
+                                     constraint=constraint)],
+                         [self.tmp_dir_time + self.temp_3_time])
+
+    def test_filename_time_span(self):
+        self.assertEqual(
+            _filename_time_span('/data/tas_Amon_A_historical_r1i1p1f1_gn_'
+                                '185001-185912.nc'),
+            ((1850, 1), (1859, 12)))
+        self.assertEqual(_filename_time_span('tas_day_19500101-19501231.nc'),
+                         ((1950, 1, 1), (1950, 12, 31)))
+        self.assertIsNone(_filename_time_span(self.temp_1_time))
+
+    def test_prune_paths(self):
+        named_paths = ['tas_185001-185912.nc',
+                       'tas_186001-186912.nc',
+                       'tas_187001-187912.nc']
+        constraint = iris.Constraint(
+            time=iris.time.PartialDateTime(year=1865))
+        self.assertEqual(_prune_paths(named_paths, constraint),
+                         ['tas_186001-186912.nc'])
+        constraint = iris.Constraint(
+            time=iris.time.PartialDateTime(year=1869, month=12))
+        self.assertEqual(_prune_paths(named_paths, constraint),
+                         ['tas_186001-186912.nc'])
+        constraint = iris.Constraint(
+            time=iris.time.PartialDateTime(month=12))
+        self.assertEqual(_prune_paths(named_paths, constraint), named_paths)
+        constraint = iris.Constraint(
+            time=iris.time.PartialDateTime(year=2000))
+        test_load, test_names = load_from_dir(self.tmp_dir_time, '.nc',
+                                              constraint)
+        self.assertEqual(test_load, [])
+        self.assertEqual(test_names, [])
+        constraint = iris.Constraint(
+            time=iris.time.PartialDateTime(year=2014, month=12, day=22))
+        paths = [self.tmp_dir_time + self.temp_1_time,
+                 self.tmp_dir_time + self.temp_2_time,
+                 self.tmp_dir_time + self.temp_3_time]
+        self.assertEqual(_prune_paths(paths, constraint),
+                         [self.tmp_dir_time + self.temp_3_time])
+        test_load, test_names = load_from_dir(self.tmp_dir_time, '.nc',
+                                              constraint)
+        self.assertEqual(test_names, [self.tmp_dir_time + self.temp_3_time])
+
     def test_parse_directory(self):
         directory = 'test_data/realistic_3d/realistic_3d_0.nc'
         self.assertEqual(_parse_directory(directory),
@@ -131,6 +244,55 @@ class TestCubeLoader(unittest.TestCase):
         self.assertFalse(_constraint_compatible(test_cube_bounds,
                                                 test_constr_pdt))
 
+    def test_needs_partial_datetime_fix(self):
+        paths = [self.tmp_dir + self.temp_1, self.tmp_dir + self.temp_2]
+        test_constr_point = iris.Constraint(
+            time=lambda cell: cell.point.day == 22)
+        test_constr_pdt = iris.Constraint(
+            time=iris.time.PartialDateTime(day=22))
+        self.assertFalse(_needs_partial_datetime_fix(paths,
+                                                     test_constr_point))
+        self.assertFalse(_needs_partial_datetime_fix(paths, test_constr_pdt))
+        bounds_cube = iris.load_cube(self.tmp_dir + self.temp_3)
+        bounds_cube.coord('time').guess_bounds()
+        bounds_path = self.tmp_dir + 'temp_bounds.nc'
+        iris.save(bounds_cube, bounds_path)
+        try:
+            self.assertTrue(_needs_partial_datetime_fix(
+                paths + [bounds_path], test_constr_pdt))
+            with mock.patch('cube_helper.cube_loader.'
+                            '_constraint_compatible') as compatible:
+                test_load, test_names = load_from_filelist(
+                    paths + [bounds_path], '.nc', constraint=test_constr_pdt)
+                self.assertFalse(compatible.called)
+            self.assertEqual(test_names, [bounds_path])
+        finally:
+            os.remove(bounds_path)
+
+    def test_needs_partial_datetime_fix_unscanned(self):
+        paths = [self.tmp_dir + self.temp_1]
+        test_constr_pdt = iris.Constraint(
+            time=iris.time.PartialDateTime(day=22))
+        multi_path = self.tmp_dir + 'temp_multi.nc'
+        first_cube = iris.load_cube(self.tmp_dir + self.temp_3)
+        second_cube = first_cube.copy()
+        second_cube.rename('air_temperature')
+        try:
+            for bounds in [False, True]:
+                if bounds:
+                    for cube in [first_cube, second_cube]:
+                        cube.coord('time').guess_bounds()
+                iris.save(iris.cube.CubeList([first_cube, second_cube]),
+                          multi_path)
+                with mock.patch('cube_helper.cube_loader._path_records',
+                                side_effect=lambda path, catalog=None:
+                                None if path == multi_path
+                                else scan_file(path)):
+                    self.assertEqual(_needs_partial_datetime_fix(
+                        paths + [multi_path], test_constr_pdt), bounds)
+        finally:
+            os.remove(multi_path)
+
     def test_fix_partial_datetime(self):
         test_cube = stock.realistic_3d()
         test_cube.coord('time').guess_bounds()
@@ -170,6 +332,34 @@ class TestCubeLoader(unittest.TestCase):
         self.assertEqual(cube_constr_full_point.points[1],
                          cube_constr_full_pdt.points[1])
 
+    def test_partial_datetime_mask(self):
+        partial_datetimes = [iris.time.PartialDateTime(month=2),
+                             iris.time.PartialDateTime(day=30),
+                             iris.time.PartialDateTime(year=1851, month=2),
+                             iris.time.PartialDateTime(hour=12)]
+        for calendar in ['standard', '360_day', 'noleap', 'all_leap']:
+            time_coord = iris.coords.DimCoord(
+                np.arange(0, 800, 0.5), standard_name='time',
+                units=cf_units.Unit('days since 1850-01-01', calendar))
+            for partial_datetime in partial_datetimes:
+                expected = [_cell_matches(cell, partial_datetime)
+                            for cell in time_coord.cells()]
+                self.assertEqual(
+                    list(_partial_datetime_mask(time_coord,
+                                                partial_datetime)),
+                    expected)
+
+    def test_partial_datetime_constraint(self):
+        test_cube = stock.realistic_3d()
+        for partial_datetime in [iris.time.PartialDateTime(day=22),
+                                 iris.time.PartialDateTime(2014, 12, 22),
+                                 iris.time.PartialDateTime(month=1)]:
+            constraint = _PartialDateTimeConstraint(partial_datetime)
+            # The cell by cell matching used without the iris internals.
+            cell_constraint = iris.Constraint(time=constraint._cell_matches)
+            self.assertEqual(test_cube.extract(constraint),
+                             test_cube.extract(cell_constraint))
+
     def tearDown(self):
         super(TestCubeLoader, self).tearDown()
         if os.path.exists(self.tmp_dir + self.temp_1):
@@ -0,0 +1,71 @@
+# (C) Crown Copyright, Met Office. All rights reserved.
+#
+# This file is part of cube_helper and is released under the
+# BSD 3-Clause license.
+# See LICENSE in the root of the repository for full licensing details.
+import unittest
+import os
+import iris
+from iris.tests import stock
+from cube_helper.cube_scanner import scan_file, scan_files
+
+
+class TestCubeScanner(unittest.TestCase):
+
+    def setUp(self):
+        super(TestCubeScanner, self).setUp()
+        abs_path = os.path.dirname(os.path.abspath(__file__))
+        self.tmp_dir_scan = abs_path + '/' + 'tmp_dir_scan/'
+        if not os.path.exists(self.tmp_dir_scan):
+            os.mkdir(self.tmp_dir_scan)
+        base_cube = stock.realistic_3d()
+        self.cube_1 = base_cube[0:2]
+        self.cube_2 = base_cube[2:4]
+        self.cube_2.coord('time').guess_bounds()
+        self.temp_1 = 'temp_1_scan.nc'
+        self.temp_2 = 'temp_2_scan.nc'
+        iris.save(self.cube_1, self.tmp_dir_scan + self.temp_1)
+        iris.save(self.cube_2, self.tmp_dir_scan + self.temp_2)
+
+    def test_scan_file(self):
+        records = scan_file(self.tmp_dir_scan + self.temp_1)
+        self.assertEqual(len(records), 1)
+        record = records[0]
+        self.assertEqual(record.path, self.tmp_dir_scan + self.temp_1)
+        self.assertEqual(record.standard_name, self.cube_1.standard_name)
+        self.assertEqual(record.units, str(self.cube_1.units))
+        self.assertEqual(record.shape, self.cube_1.shape)
+        self.assertEqual(record.dtype, self.cube_1.dtype)
+        self.assertEqual([c.standard_name for c in record.dim_coords],
+                         [c.standard_name for c in self.cube_1.dim_coords])
+        self.assertEqual(sorted(c.standard_name for c in record.aux_coords),
+                         ['air_pressure', 'forecast_period'])
+        self.assertEqual(record.attributes['source'], 'Iris test case')
+        time_coord = self.cube_1.coord('time')
+        self.assertEqual(record.time_units.origin, time_coord.units.origin)
+        self.assertEqual(record.time_start, time_coord.points[0])
+        self.assertEqual(record.time_end, time_coord.points[-1])
+
+    def test_scan_files_bounds(self):
+        records = scan_files([self.tmp_dir_scan + self.temp_1,
+                              self.tmp_dir_scan + self.temp_2])
+        self.assertEqual([record.path for record in records],
+                         [self.tmp_dir_scan + self.temp_1,
+                          self.tmp_dir_scan + self.temp_2])
+        time_coord = self.cube_2.coord('time')
+        self.assertEqual(records[1].time_start, time_coord.bounds[0][0])
+        self.assertEqual(records[1].time_end, time_coord.bounds[-1][-1])
+        self.assertFalse(records[0].time_bounds)
+        self.assertTrue(records[1].time_bounds)
+
+    def tearDown(self):
+        super(TestCubeScanner, self).tearDown()
+        if os.path.exists(self.tmp_dir_scan + self.temp_1):
+            os.remove(self.tmp_dir_scan + self.temp_1)
+        if os.path.exists(self.tmp_dir_scan + self.temp_2):
+            os.remove(self.tmp_dir_scan + self.temp_2)
+        os.removedirs(self.tmp_dir_scan)
+
+
+if __name__ == '__main__':
+    unittest.main()